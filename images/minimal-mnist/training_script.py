@@ -1,16 +1,297 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
 import click
+import numpy as np
 from sklearn import datasets, svm, metrics
 from sklearn.model_selection import train_test_split
 from datetime import datetime, timezone
 
 
+SPLITS = ["X_train", "X_val", "X_test", "y_train", "y_val", "y_test"]
+
+DEFAULT_DATA_CACHE_DIR = os.path.join(tempfile.gettempdir(), "minimal-mnist-data")
+
+# data of the current process, loaded once by `_init_worker`
+_splits: Dict[str, np.ndarray] = {}
+
+
+def load_splits(data_cache_dir: str) -> Dict[str, np.ndarray]:
+    """Loads the train, validation and test splits as memory-mapped `.npy` files.
+
+    The dataset is only parsed and split if the files don't exist yet. They are written
+    under a temporary name and renamed, so that processes sharing `data_cache_dir` never
+    read a partially written file.
+    """
+    paths = {name: os.path.join(data_cache_dir, f"{name}.npy") for name in SPLITS}
+    if not all(os.path.exists(path) for path in paths.values()):
+        # Load the MNIST dataset
+        digits = datasets.load_digits()
+
+        # Split into training, validation, and test sets
+        X_train, X_temp, y_train, y_temp = train_test_split(
+            digits.data, digits.target, test_size=0.4, random_state=42
+        )
+        X_val, X_test, y_val, y_test = train_test_split(
+            X_temp, y_temp, test_size=0.5, random_state=42
+        )
+
+        os.makedirs(data_cache_dir, exist_ok=True)
+        arrays = dict(
+            X_train=X_train, X_val=X_val, X_test=X_test, y_train=y_train, y_val=y_val, y_test=y_test
+        )
+        for name, array in arrays.items():
+            tmp_path = f"{paths[name]}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, paths[name])
+
+    return {name: np.load(path, mmap_mode="r") for name, path in paths.items()}
+
+
+def _timestamp() -> str:
+    return (
+        datetime.now().astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+        + "Z"
+    )
+
+
+def evaluate_trial(
+    splits: Dict[str, np.ndarray],
+    params: Dict,
+    data_fractions: Sequence[float] = (1.0,),
+    min_validation_accuracy: Optional[float] = None,
+) -> Iterator[Tuple[str, Dict[str, float]]]:
+    """Fits an SVM with the hyperparameters in `params` and yields its accuracies.
+
+    The SVM is fitted on growing fractions of the training set, e.g. `(0.1, 0.5, 1.0)`,
+    and the train and validation accuracies are yielded with a timestamp after every
+    stage. If the validation accuracy of a stage is below `min_validation_accuracy`, the
+    remaining stages are skipped. The test accuracy is only computed in the last stage.
+    """
+    for stage, fraction in enumerate(data_fractions):
+        last_stage = stage == len(data_fractions) - 1
+        # the training set was shuffled by the split, so its first rows are a random subset
+        n_samples = max(1, round(fraction * len(splits["y_train"])))
+        X_train, y_train = splits["X_train"][:n_samples], splits["y_train"][:n_samples]
+
+        # Create the SVM classifier with specified hyperparameters
+        clf = svm.SVC(
+            C=params["c"],
+            kernel=params["kernel"],
+            gamma=params["gamma"],
+            degree=params["degree"],
+            coef0=params["coef0"],
+        )
+
+        # Train the model
+        clf.fit(X_train, y_train)
+
+        # Make predictions and evaluate on the training and validation set
+        accuracies = {
+            "Train-Accuracy": metrics.accuracy_score(y_train, clf.predict(X_train)),
+            "Validation-Accuracy": metrics.accuracy_score(splits["y_val"], clf.predict(splits["X_val"])),
+        }
+        if last_stage:
+            accuracies["Test-Accuracy"] = metrics.accuracy_score(
+                splits["y_test"], clf.predict(splits["X_test"])
+            )
+        yield _timestamp(), accuracies
+
+        if (
+            min_validation_accuracy is not None
+            and accuracies["Validation-Accuracy"] < min_validation_accuracy
+        ):
+            return
+
+
+# hyperparameters each kernel uses besides C
+KERNEL_PARAMS = {
+    "linear": [],
+    "rbf": ["gamma"],
+    "sigmoid": ["gamma", "coef0"],
+    "poly": ["gamma", "degree", "coef0"],
+}
+
+
+def canonical_params(params: Dict) -> Dict:
+    """Drops the hyperparameters the kernel ignores, e.g. `degree` for 'rbf'."""
+    canonical = {"kernel": params["kernel"], "c": float(params["c"])}
+    for name in KERNEL_PARAMS.get(params["kernel"], ["gamma", "degree", "coef0"]):
+        canonical[name] = int(params[name]) if name == "degree" else float(params[name])
+    return canonical
+
+
+def data_fingerprint(splits: Dict[str, np.ndarray]) -> str:
+    digest = hashlib.sha256()
+    for name in SPLITS:
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(splits[name]).tobytes())
+    return digest.hexdigest()
+
+
+def evaluate_trial_cached(
+    splits: Dict[str, np.ndarray],
+    params: Dict,
+    result_cache_dir: Optional[str] = None,
+    **stage_options,
+) -> Iterator[Tuple[str, Dict[str, float]]]:
+    """Like `evaluate_trial`, but memoizes the metrics in `result_cache_dir`.
+
+    The cache key is a hash of the hyperparameters the kernel actually uses, the stage
+    options and a fingerprint of the data, so equivalent trials are only fitted once.
+    Cached metrics are yielded with the current time as timestamp.
+    """
+    if result_cache_dir is None:
+        yield from evaluate_trial(splits, params, **stage_options)
+        return
+
+    key = json.dumps(
+        {"params": canonical_params(params), "data": data_fingerprint(splits), **stage_options},
+        sort_keys=True,
+    )
+    path = os.path.join(result_cache_dir, f"{hashlib.sha256(key.encode()).hexdigest()}.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            for accuracies in json.load(f)["stages"]:
+                yield _timestamp(), accuracies
+        return
+
+    stages = []
+    for timestamp, accuracies in evaluate_trial(splits, params, **stage_options):
+        stages.append(accuracies)
+        yield timestamp, accuracies
+
+    # written under a temporary name and renamed, as trials may share the cache
+    os.makedirs(result_cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"key": json.loads(key), "stages": stages}, f)
+    os.replace(tmp_path, path)
+
+
+def print_metrics(stages: Iterable[Tuple[str, Dict[str, float]]]) -> None:
+    """Prints the metrics of every stage in the format of Katib's StdOut metrics collector."""
+    stopped_early = False
+    for timestamp, accuracies in stages:
+        for name, value in accuracies.items():
+            print(f"{timestamp} {name}={value:.2f}")
+        sys.stdout.flush()
+        stopped_early = "Test-Accuracy" not in accuracies
+    if stopped_early:
+        print("# stopped early, the validation accuracy is below --min-validation-accuracy")
+
+
+def read_trials(path: str, defaults: Dict) -> Iterator[Dict]:
+    """Yields hyperparameter sets from a JSON lines file, or from stdin if `path` is `-`.
+
+    Each line is an object like `{"gamma": 0.01, "c": 10, "kernel": "rbf"}`, missing
+    hyperparameters are taken from the command line options.
+    """
+    f = sys.stdin if path == "-" else open(path)
+    try:
+        for line in f:
+            if line.strip():
+                yield {**defaults, **json.loads(line)}
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _init_worker(data_cache_dir: str) -> None:
+    _splits.update(load_splits(data_cache_dir))
+
+
+def _evaluate_in_worker(params: Dict, **trial_options) -> List[Tuple[str, Dict[str, float]]]:
+    return list(evaluate_trial_cached(_splits, params, **trial_options))
+
+
+def run_trials(trials: Iterator[Dict], data_cache_dir: str, workers: int, **trial_options) -> None:
+    """Evaluates all trials in one warm process or, with `workers > 1`, in a process pool.
+
+    The results are printed in the order of the trials, each preceded by a line with its
+    hyperparameters. At most `2 * workers` trials are in flight, so trials can be streamed.
+    `trial_options` are passed on to `evaluate_trial_cached`.
+    """
+
+    def report(i: int, params: Dict, stages: Iterable[Tuple[str, Dict[str, float]]]) -> None:
+        print(f"# trial {i} {json.dumps(params)}")
+        print_metrics(stages)
+
+    if workers <= 1:
+        _init_worker(data_cache_dir)
+        for i, params in enumerate(trials):
+            report(i, params, evaluate_trial_cached(_splits, params, **trial_options))
+        return
+
+    # parse the dataset once before the workers memory-map it
+    load_splits(data_cache_dir)
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(data_cache_dir,)
+    ) as pool:
+        in_flight = deque()
+        for i, params in enumerate(trials):
+            in_flight.append((i, params, pool.submit(_evaluate_in_worker, params, **trial_options)))
+            if len(in_flight) >= 2 * workers:
+                i, params, future = in_flight.popleft()
+                report(i, params, future.result())
+        while in_flight:
+            i, params, future = in_flight.popleft()
+            report(i, params, future.result())
+
+
 @click.command()
 @click.option("--gamma", default=0.001, type=float)
 @click.option("--c", default=1.0, type=float)
 @click.option("--kernel", default="rbf", type=str)
 @click.option("--degree", default=3, type=int)
 @click.option("--coef0", default=0.0, type=float)
-def train_svm(gamma: float, c: float, kernel: str, degree: int, coef0: float) -> None:
+@click.option(
+    "--trials",
+    default=None,
+    type=str,
+    help="JSON lines file with one hyperparameter set per line ('-' for stdin). "
+    "All sets are evaluated in this process instead of only the one given by the options.",
+)
+@click.option("--workers", default=1, type=int, help="Number of processes evaluating --trials.")
+@click.option("--data-cache-dir", default=DEFAULT_DATA_CACHE_DIR, type=str)
+@click.option(
+    "--data-fractions",
+    default="1.0",
+    type=str,
+    help="Comma-separated, growing fractions of the training set to fit on, e.g. '0.1,0.25,0.5,1.0'.",
+)
+@click.option(
+    "--min-validation-accuracy",
+    default=None,
+    type=float,
+    help="Stop a trial after the first stage with a lower validation accuracy.",
+)
+@click.option(
+    "--result-cache-dir",
+    default=None,
+    type=str,
+    help="Directory, e.g. on a shared volume, in which the metrics of finished trials are memoized.",
+)
+def train_svm(
+    gamma: float,
+    c: float,
+    kernel: str,
+    degree: int,
+    coef0: float,
+    trials: Optional[str],
+    workers: int,
+    data_cache_dir: str,
+    data_fractions: str,
+    min_validation_accuracy: Optional[float],
+    result_cache_dir: Optional[str],
+) -> None:
     """Train an SVM model on the MNIST dataset using specified hyperparameters.
 
     Args:
@@ -23,44 +304,32 @@ def train_svm(gamma: float, c: float, kernel: str, degree: int, coef0: float) ->
                       kernels.
         coef0 (float): Independent term in kernel function. It is only significant in 'poly'
                        and 'sigmoid'.
+        trials (str): Optional JSON lines file (or '-' for stdin) with hyperparameter sets,
+                      which are evaluated one after another in this process.
+        workers (int): Number of processes evaluating the trials in parallel.
+        data_cache_dir (str): Directory of the memory-mapped dataset splits.
+        data_fractions (str): Comma-separated fractions of the training set. The model is
+                              fitted on each of them, reporting intermediate metrics.
+        min_validation_accuracy (float): Validation accuracy below which a trial is stopped
+                                         before fitting on the next fraction.
+        result_cache_dir (str): Optional directory in which trial results are memoized.
     """
-    # Load the MNIST dataset
-    digits = datasets.load_digits()
-
-    # Split into training, validation, and test sets
-    X_train, X_temp, y_train, y_temp = train_test_split(
-        digits.data, digits.target, test_size=0.4, random_state=42
+    params = dict(gamma=gamma, c=c, kernel=kernel, degree=degree, coef0=coef0)
+    fractions = [float(fraction) for fraction in data_fractions.split(",")]
+    if fractions != sorted(fractions) or not 0 < fractions[0] or fractions[-1] > 1:
+        raise click.BadParameter("must be growing fractions in (0, 1]", param_hint="--data-fractions")
+    trial_options = dict(
+        data_fractions=fractions,
+        min_validation_accuracy=min_validation_accuracy,
+        result_cache_dir=result_cache_dir,
     )
-    X_val, X_test, y_val, y_test = train_test_split(
-        X_temp, y_temp, test_size=0.5, random_state=42
-    )
-
-    # Create the SVM classifier with specified hyperparameters
-    clf = svm.SVC(C=c, kernel=kernel, gamma=gamma, degree=degree, coef0=coef0)
-
-    # Train the model
-    clf.fit(X_train, y_train)
-
-    # Make predictions and evaluate on the training set
-    y_train_pred = clf.predict(X_train)
-    train_accuracy = metrics.accuracy_score(y_train, y_train_pred)
 
-    # Make predictions and evaluate on the validation set
-    y_val_pred = clf.predict(X_val)
-    val_accuracy = metrics.accuracy_score(y_val, y_val_pred)
-
-    # Make predictions and evaluate on the test set
-    y_test_pred = clf.predict(X_test)
-    test_accuracy = metrics.accuracy_score(y_test, y_test_pred)
+    if trials is not None:
+        run_trials(read_trials(trials, params), data_cache_dir, workers, **trial_options)
+        return
 
     # Print to std out for katib
-    timestamp = (
-        datetime.now().astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
-        + "Z"
-    )
-    print(f"{timestamp} Train-Accuracy={train_accuracy:.2f}")
-    print(f"{timestamp} Validation-Accuracy={val_accuracy:.2f}")
-    print(f"{timestamp} Test-Accuracy={test_accuracy:.2f}")
+    print_metrics(evaluate_trial_cached(load_splits(data_cache_dir), params, **trial_options))
 
 
 if __name__ == "__main__":
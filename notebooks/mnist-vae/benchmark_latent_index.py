@@ -0,0 +1,111 @@
+"""
+Measures the query latency of the latent nearest-neighbour index.
+
+Encodes the MNIST training set with a trained VAE (once, the latent means are
+stored as memory-mapped files in --index_dir) and compares a naive Python loop
+over all points with the vectorized brute-force search and, if hnswlib is
+installed, the approximate HNSW index.
+"""
+import math
+import os
+import time
+from typing import Callable
+
+import click
+import numpy as np
+from torch.utils.data import BatchSampler, DataLoader, SequentialSampler
+
+from model.datamodule import PreloadedMNIST
+from model.latent_index import LatentIndex, encode_dataset, hnswlib
+from model.vae import VAE
+
+
+def naive_query(latents: np.ndarray, query: np.ndarray, k: int) -> list:
+    """
+    Finds the k nearest neighbours of one query with a Python loop over all points.
+
+    Args:
+        latents (np.ndarray): Indexed points of shape (n, latent_dim).
+        query (np.ndarray): One latent vector.
+        k (int): Number of neighbours.
+
+    Returns:
+        list: Indices of the neighbours, sorted by distance.
+    """
+    query = query.tolist()
+    distances = [
+        (math.dist(query, point), i) for i, point in enumerate(latents.tolist())
+    ]
+    return [i for _, i in sorted(distances)[:k]]
+
+
+def per_query_ms(func: Callable, n_queries: int) -> float:
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) / n_queries * 1000
+
+
+@click.command()
+@click.option('--checkpoint', required=True, type=str, help='Lightning checkpoint of the VAE.')
+@click.option('--index_dir', default='./latent_index', type=str, help='Directory of the encoded dataset.')
+@click.option('--data_path', default='./data', type=str, help='Directory of the MNIST data.')
+@click.option('--queries', default=1000, type=int, help='Number of queries.')
+@click.option('--naive_queries', default=5, type=int, help='Number of queries of the naive loop.')
+@click.option('--k', default=10, type=int, help='Number of neighbours.')
+def benchmark(checkpoint: str, index_dir: str, data_path: str, queries: int, naive_queries: int, k: int) -> None:
+    """
+    Encodes the training set if needed and prints the query latency of each method.
+
+    Args:
+        checkpoint (str): Lightning checkpoint of the VAE.
+        index_dir (str): Directory of the encoded dataset.
+        data_path (str): Directory of the MNIST data.
+        queries (int): Number of queries.
+        naive_queries (int): Number of queries of the naive loop, which is slow.
+        k (int): Number of neighbours.
+    """
+    if not os.path.exists(os.path.join(index_dir, 'latents.npy')):
+        dataset = PreloadedMNIST(data_path, train=True)
+        # the dataset returns whole batches, see PreloadedMNIST
+        dataloader = DataLoader(
+            dataset, sampler=BatchSampler(SequentialSampler(dataset), batch_size=4096, drop_last=False), batch_size=None
+        )
+        model = VAE.load_from_checkpoint(checkpoint, map_location='cpu')
+        start = time.perf_counter()
+        encode_dataset(model, dataloader, index_dir)
+        print(f'Encoded the training set in {time.perf_counter() - start:.2f}s')
+
+    index = LatentIndex.load(index_dir, method='exact')
+    rng = np.random.default_rng(42)
+    query_points = index.latents[rng.integers(0, len(index.latents), queries)] + rng.normal(
+        0, 0.1, (queries, index.latents.shape[1])
+    ).astype(np.float32)
+
+    results = {
+        'naive loop': per_query_ms(
+            lambda: [naive_query(index.latents, q, k) for q in query_points[:naive_queries]], naive_queries
+        ),
+        'exact, one by one': per_query_ms(lambda: [index.query(q, k) for q in query_points], queries),
+        'exact, batched': per_query_ms(lambda: index.query(query_points, k), queries),
+    }
+    exact_distances, _ = index.query(query_points, k)
+
+    if hnswlib is not None:
+        start = time.perf_counter()
+        hnsw_index = LatentIndex.load(index_dir, method='hnsw')
+        print(f'Built or loaded the HNSW graph in {time.perf_counter() - start:.2f}s')
+        results['hnsw, one by one'] = per_query_ms(lambda: [hnsw_index.query(q, k) for q in query_points], queries)
+        results['hnsw, batched'] = per_query_ms(lambda: hnsw_index.query(query_points, k), queries)
+        hnsw_distances, _ = hnsw_index.query(query_points, k)
+        # compared by distance, since many points share the same distance to a query
+        recall = np.mean(hnsw_distances <= exact_distances[:, -1:] * (1 + 1e-4) + 1e-6)
+        print(f'HNSW recall@{k}: {recall:.3f}')
+
+    print(f'\n{len(index.latents)} points, latent_dim={index.latents.shape[1]}, k={k}')
+    print(f'{"method":<20}{"ms/query":>12}{"speedup":>12}')
+    for name, ms in results.items():
+        print(f'{name:<20}{ms:>12.4f}{results["naive loop"] / ms:>11.0f}x')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,105 @@
+"""
+Measures the training throughput of run_training.py in different configurations.
+
+Every configuration trains for a fixed number of steps in a fresh process, since
+thread settings can only be applied once per process, and the samples/s reported
+by `ThroughputCallback` are collected into a table.
+"""
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+import click
+
+from run_training import cpus_per_process
+
+
+def configurations(num_threads: int) -> Dict[str, List[str]]:
+    """
+    Returns the benchmarked configurations as extra arguments of run_training.py.
+
+    Args:
+        num_threads (int): Intra-op threads of the "threads" configuration.
+
+    Returns:
+        Dict[str, List[str]]: Command line arguments by configuration name.
+    """
+    return {
+        'default': [],
+        'threads': ['--num_threads', str(num_threads), '--num_interop_threads', '1'],
+        'bf16-mixed': ['--precision', 'bf16-mixed'],
+        'compile': ['--compile'],
+        'batch 256': ['--batch_size', '256'],
+        'performance': ['--performance'],
+    }
+
+
+def measure(args: List[str], max_steps: int, data_path: str) -> Optional[float]:
+    """
+    Runs run_training.py with `args` and returns its training throughput.
+
+    Every run starts from scratch with its own temporary checkpoint directory, so
+    that it neither resumes from the checkpoint of another configuration nor writes
+    into the checkpoints of real training runs.
+
+    Args:
+        args (List[str]): Extra command line arguments of run_training.py.
+        max_steps (int): Number of training steps.
+        data_path (str): Directory of the MNIST data.
+
+    Returns:
+        Optional[float]: Samples/s, or None if the run failed.
+    """
+    checkpoint_dir = tempfile.mkdtemp(prefix='benchmark-checkpoints-')
+    try:
+        result = subprocess.run(
+            [
+                sys.executable, 'run_training.py', '--max_steps', str(max_steps), '--data_path', data_path,
+                '--no-resume', '--checkpoint_dir', checkpoint_dir, *args,
+            ],
+            capture_output=True,
+            text=True,
+        )
+    finally:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    match = re.search(r'Training throughput: ([\d.]+) samples/s', result.stdout)
+    if match is None:
+        print(result.stdout[-2000:], result.stderr[-2000:], file=sys.stderr)
+        return None
+    return float(match.group(1))
+
+
+@click.command()
+@click.option('--max_steps', default=300, type=int, help='Training steps per configuration.')
+@click.option('--data_path', default='./data', type=str, help='Directory of the MNIST data.')
+@click.option('--num_threads', default=None, type=int, help='Threads of the "threads" configuration.')
+def benchmark(max_steps: int, data_path: str, num_threads: Optional[int]) -> None:
+    """
+    Trains the VAE in every configuration and prints the samples/s.
+
+    Args:
+        max_steps (int): Training steps per configuration.
+        data_path (str): Directory of the MNIST data.
+        num_threads (Optional[int]): Intra-op threads of the "threads" configuration,
+            defaults to the number of CPUs available to the process.
+    """
+    results = {}
+    for name, args in configurations(num_threads or cpus_per_process()).items():
+        print(f'Running {name}: {" ".join(args)}')
+        results[name] = measure(args, max_steps, data_path)
+
+    baseline = results['default']
+    print(f'\n{"configuration":<16}{"samples/s":>12}{"speedup":>10}')
+    for name, samples_per_sec in results.items():
+        if samples_per_sec is None:
+            print(f'{name:<16}{"failed":>12}')
+        else:
+            speedup = f'{samples_per_sec / baseline:.2f}x' if baseline else ''
+            print(f'{name:<16}{samples_per_sec:>12.0f}{speedup:>10}')
+
+
+if __name__ == '__main__':
+    benchmark()
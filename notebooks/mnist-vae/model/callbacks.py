@@ -0,0 +1,237 @@
+import os
+import resource
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+import pytorch_lightning as pl
+import torch
+
+
+class ThroughputCallback(pl.Callback):
+    """
+    PyTorch Lightning callback measuring the training throughput in samples/s.
+
+    Only training batches are counted, and the time spent in validation is
+    excluded. The first `warmup_steps` batches are skipped, so that one-off
+    costs like `torch.compile` don't distort the result. The throughput of
+    every epoch is logged as `train_samples_per_sec`, summed over all
+    processes in distributed training, and the overall throughput of every
+    process is printed at the end of training.
+
+    Attributes:
+        warmup_steps (int): Number of training batches not measured.
+        samples_per_sec (Optional[float]): Overall throughput after training.
+    """
+
+    def __init__(self, warmup_steps: int = 10):
+        """
+        Initializes the ThroughputCallback.
+
+        Args:
+            warmup_steps (int): Number of training batches not measured.
+        """
+        super().__init__()
+        self.warmup_steps = warmup_steps
+        self.samples_per_sec: Optional[float] = None
+        self._steps = 0
+        self._samples = 0
+        self._seconds = 0.0
+        self._epoch_samples = 0
+        self._epoch_seconds = 0.0
+        self._batch_start: Optional[float] = None
+
+    def on_train_epoch_start(self, trainer: pl.Trainer, pl_module: pl.LightningModule) -> None:
+        self._epoch_samples = 0
+        self._epoch_seconds = 0.0
+        self._batch_start = None
+
+    def on_train_batch_start(
+        self, trainer: pl.Trainer, pl_module: pl.LightningModule, batch: Any, batch_idx: int
+    ) -> None:
+        # the time since the end of the previous batch is spent loading this one
+        if self._batch_start is None:
+            self._batch_start = time.perf_counter()
+
+    def on_train_batch_end(
+        self,
+        trainer: pl.Trainer,
+        pl_module: pl.LightningModule,
+        outputs: Any,
+        batch: Any,
+        batch_idx: int,
+    ) -> None:
+        now = time.perf_counter()
+        self._steps += 1
+        if self._steps > self.warmup_steps:
+            batch_size = len(batch[0])
+            self._epoch_samples += batch_size
+            self._epoch_seconds += now - self._batch_start
+            self._samples += batch_size
+            self._seconds += now - self._batch_start
+        self._batch_start = now
+
+    def on_validation_start(self, trainer: pl.Trainer, pl_module: pl.LightningModule) -> None:
+        # don't count validation as loading the next training batch
+        self._batch_start = None
+
+    def on_train_epoch_end(self, trainer: pl.Trainer, pl_module: pl.LightningModule) -> None:
+        # every process has to take part in the sum, even without measured batches
+        samples_per_sec = self._epoch_samples / self._epoch_seconds if self._epoch_seconds > 0 else 0.0
+        pl_module.log("train_samples_per_sec", samples_per_sec, sync_dist=True, reduce_fx="sum")
+        if trainer.world_size > 1:
+            print(f"[rank {trainer.global_rank}] epoch {trainer.current_epoch}: {samples_per_sec:.0f} samples/s")
+
+    def on_fit_end(self, trainer: pl.Trainer, pl_module: pl.LightningModule) -> None:
+        if self._seconds > 0:
+            self.samples_per_sec = self._samples / self._seconds
+            prefix = f"[rank {trainer.global_rank}] " if trainer.world_size > 1 else ""
+            print(f"{prefix}Training throughput: {self.samples_per_sec:.0f} samples/s")
+
+
+class TrainingProfilerCallback(pl.Callback):
+    """
+    PyTorch Lightning callback showing where the time of a training step goes.
+
+    Every training step is split into the time blocked on the dataloader
+    (from the end of the previous step to the start of this one), the forward
+    pass including the loss, the backward pass and the optimizer step. Their
+    means over the last `trainer.log_every_n_steps` steps are logged to the
+    trainer's logger under `profile/`, together with samples/s, the fraction
+    of the time spent waiting for data and the peak memory of the process.
+
+    Optionally, `trace_steps` steps starting at `trace_start_step` are traced
+    with `torch.profiler`, written to `<log_dir>/profiler` in the format of
+    TensorBoard's profiler plugin.
+
+    Attributes:
+        trace_start_step (int): Global step at which the trace starts.
+        trace_steps (int): Number of traced steps, 0 disables tracing.
+    """
+
+    def __init__(self, trace_start_step: int = 20, trace_steps: int = 0):
+        """
+        Initializes the TrainingProfilerCallback.
+
+        Args:
+            trace_start_step (int): Global step at which the trace starts.
+            trace_steps (int): Number of traced steps, 0 disables tracing.
+        """
+        super().__init__()
+        self.trace_start_step = trace_start_step
+        self.trace_steps = trace_steps
+        self._totals: Dict[str, float] = defaultdict(float)
+        self._steps = 0
+        self._samples = 0
+        self._times: Dict[str, float] = {}
+        self._previous_batch_end: Optional[float] = None
+        self._profiler: Optional[torch.profiler.profile] = None
+
+    def _now(self, pl_module: pl.LightningModule) -> float:
+        # CUDA kernels run asynchronously, wait for them to measure their time
+        if pl_module.device.type == "cuda":
+            torch.cuda.synchronize(pl_module.device)
+        return time.perf_counter()
+
+    @staticmethod
+    def _peak_memory_mb(pl_module: pl.LightningModule) -> float:
+        if pl_module.device.type == "cuda":
+            return torch.cuda.max_memory_allocated(pl_module.device) / 2**20
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def on_train_epoch_start(self, trainer: pl.Trainer, pl_module: pl.LightningModule) -> None:
+        self._previous_batch_end = None
+
+    def on_validation_start(self, trainer: pl.Trainer, pl_module: pl.LightningModule) -> None:
+        # don't count validation as waiting for the next training batch
+        self._previous_batch_end = None
+
+    def on_train_batch_start(
+        self, trainer: pl.Trainer, pl_module: pl.LightningModule, batch: Any, batch_idx: int
+    ) -> None:
+        if self.trace_steps and trainer.global_step == self.trace_start_step:
+            self._start_trace(trainer)
+        self._times = {"batch_start": self._now(pl_module)}
+
+    def on_before_backward(
+        self, trainer: pl.Trainer, pl_module: pl.LightningModule, loss: torch.Tensor
+    ) -> None:
+        self._times["before_backward"] = self._now(pl_module)
+
+    def on_after_backward(self, trainer: pl.Trainer, pl_module: pl.LightningModule) -> None:
+        self._times["after_backward"] = self._now(pl_module)
+
+    def on_before_optimizer_step(
+        self, trainer: pl.Trainer, pl_module: pl.LightningModule, optimizer: torch.optim.Optimizer
+    ) -> None:
+        self._times["before_optimizer_step"] = self._now(pl_module)
+
+    def on_train_batch_end(
+        self,
+        trainer: pl.Trainer,
+        pl_module: pl.LightningModule,
+        outputs: Any,
+        batch: Any,
+        batch_idx: int,
+    ) -> None:
+        now = self._now(pl_module)
+        times = self._times
+        if self._previous_batch_end is not None:
+            self._totals["dataloader"] += times["batch_start"] - self._previous_batch_end
+        self._totals["forward"] += times.get("before_backward", now) - times["batch_start"]
+        if "after_backward" in times:
+            self._totals["backward"] += times["after_backward"] - times["before_backward"]
+        if "before_optimizer_step" in times:
+            self._totals["optimizer"] += now - times["before_optimizer_step"]
+        self._totals["step"] += now - (self._previous_batch_end or times["batch_start"])
+        self._previous_batch_end = now
+        self._steps += 1
+        self._samples += len(batch[0])
+
+        if self._profiler is not None:
+            self._profiler.step()
+            if trainer.global_step >= self.trace_start_step + self.trace_steps:
+                self._stop_trace()
+
+        if self._steps >= trainer.log_every_n_steps:
+            self._log(trainer, pl_module)
+
+    def _log(self, trainer: pl.Trainer, pl_module: pl.LightningModule) -> None:
+        metrics = {
+            f"profile/{name}_ms": self._totals[name] / self._steps * 1000
+            for name in ("dataloader", "forward", "backward", "optimizer")
+        }
+        if self._totals["step"] > 0:
+            metrics["profile/samples_per_sec"] = self._samples / self._totals["step"]
+            metrics["profile/dataloader_stall_fraction"] = self._totals["dataloader"] / self._totals["step"]
+        metrics["profile/peak_memory_mb"] = self._peak_memory_mb(pl_module)
+        if trainer.logger is not None:
+            trainer.logger.log_metrics(metrics, step=trainer.global_step)
+        self._totals.clear()
+        self._steps = 0
+        self._samples = 0
+
+    def _start_trace(self, trainer: pl.Trainer) -> None:
+        log_dir = trainer.logger.log_dir if trainer.logger is not None else trainer.default_root_dir
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self._profiler = torch.profiler.profile(
+            activities=activities,
+            schedule=torch.profiler.schedule(wait=0, warmup=1, active=max(1, self.trace_steps - 1)),
+            on_trace_ready=torch.profiler.tensorboard_trace_handler(
+                os.path.join(log_dir, "profiler"), worker_name=f"rank{trainer.global_rank}"
+            ),
+            record_shapes=True,
+            profile_memory=True,
+        )
+        self._profiler.start()
+
+    def _stop_trace(self) -> None:
+        self._profiler.stop()
+        self._profiler = None
+
+    def on_fit_end(self, trainer: pl.Trainer, pl_module: pl.LightningModule) -> None:
+        if self._profiler is not None:
+            self._stop_trace()
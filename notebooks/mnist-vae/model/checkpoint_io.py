@@ -0,0 +1,29 @@
+from typing import Any
+
+import torch
+from lightning_utilities.core.apply_func import apply_to_collection
+from pytorch_lightning.plugins import AsyncCheckpointIO
+
+
+class SnapshotAsyncCheckpointIO(AsyncCheckpointIO):
+    """
+    AsyncCheckpointIO that copies the checkpoint to CPU memory before handing it to
+    the background thread.
+
+    Up to pytorch-lightning 2.1, AsyncCheckpointIO writes the live tensors of the
+    model and optimizer state from its thread, so the optimizer steps taken while
+    the file is written can change them and the checkpoint mixes several steps.
+    Here, the training loop waits for the copy only, and the thread writes the copy.
+    """
+
+    def save_checkpoint(self, checkpoint: Any, *args: Any, **kwargs: Any) -> None:
+        """
+        Copies all tensors of `checkpoint` to CPU and saves the copy on the background thread.
+
+        Args:
+            checkpoint (Any): The state to save, as built by the Trainer.
+            *args (Any): Path and storage options, passed on to AsyncCheckpointIO.
+            **kwargs (Any): Path and storage options, passed on to AsyncCheckpointIO.
+        """
+        snapshot = apply_to_collection(checkpoint, torch.Tensor, lambda t: t.detach().to('cpu', copy=True))
+        super().save_checkpoint(snapshot, *args, **kwargs)
@@ -1,10 +1,99 @@
-from typing import Optional
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
 import pytorch_lightning as pl
-from torch.utils.data import DataLoader
+import torch
+import torch.distributed as dist
+from torch.utils.data import (
+    BatchSampler,
+    DataLoader,
+    Dataset,
+    DistributedSampler,
+    RandomSampler,
+    Sampler,
+    SequentialSampler,
+)
 from torchvision.datasets import MNIST
 from torchvision.transforms import transforms
 
 
+class _EpochBatchSampler(BatchSampler):
+    """
+    BatchSampler which passes `set_epoch` on to its sampler, so that a
+    DistributedSampler shuffles differently in every epoch.
+    """
+
+    def set_epoch(self, epoch: int) -> None:
+        if hasattr(self.sampler, "set_epoch"):
+            self.sampler.set_epoch(epoch)
+
+
+class PreloadedMNIST(Dataset):
+    """
+    MNIST held in memory as one contiguous uint8 tensor.
+
+    The images are decoded once and cached as `.npy` files under
+    `<data_path>/MNIST/preloaded`, which are memory-mapped on later runs.
+    Indexing with a list of indices returns a whole batch by slicing the
+    tensor, which avoids the per-sample conversion of `transforms.ToTensor()`.
+    The batches are the same as with `ToTensor()`: float32 images of shape
+    (batch, 1, 28, 28) in [0, 1] and int64 labels.
+
+    Attributes:
+        images (torch.Tensor): uint8 tensor of shape (n, 28, 28).
+        targets (torch.Tensor): int64 tensor of shape (n,).
+    """
+
+    def __init__(self, data_path: str, train: bool = True):
+        """
+        Initializes the PreloadedMNIST dataset, downloading and decoding
+        MNIST if it is not cached yet.
+
+        Args:
+            data_path (str): Path to the directory where the MNIST data is
+                stored.
+            train (bool): Whether to load the training or the test split.
+        """
+        cache_dir = os.path.join(data_path, "MNIST", "preloaded")
+        split = "train" if train else "test"
+        images_path = os.path.join(cache_dir, f"{split}-images.npy")
+        targets_path = os.path.join(cache_dir, f"{split}-targets.npy")
+
+        if not (os.path.exists(images_path) and os.path.exists(targets_path)):
+            mnist = MNIST(data_path, train=train, download=True)
+            os.makedirs(cache_dir, exist_ok=True)
+            for path, tensor in [(images_path, mnist.data), (targets_path, mnist.targets)]:
+                # write to a temporary file first, so that concurrent runs
+                # never read a partially written cache
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, tensor.numpy())
+                os.replace(tmp_path, path)
+
+        # copy-on-write memory maps are writable, as torch.from_numpy expects
+        self.images = torch.from_numpy(np.load(images_path, mmap_mode="c"))
+        self.targets = torch.from_numpy(np.load(targets_path, mmap_mode="c")).long()
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+    def __getitem__(self, indices: List[int]) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Returns the batch of images and labels at `indices`.
+
+        Args:
+            indices (List[int]): Indices of the samples in the batch.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: Images scaled to [0, 1] with
+                shape (len(indices), 1, 28, 28) and their labels.
+        """
+        indices = torch.as_tensor(indices)
+        images = self.images[indices].unsqueeze(1).float().div_(255)
+        return images, self.targets[indices]
+
+
 class MNISTDataModule(pl.LightningDataModule):
     """
     PyTorch Lightning Data Module for the MNIST dataset.
@@ -17,10 +106,16 @@ class MNISTDataModule(pl.LightningDataModule):
         stored.
         num_workers (int): Number of subprocesses to use for data loading.
         batch_size (int): How many samples per batch to load.
+        preload (bool): Whether to serve whole batches from a preloaded
+        tensor (see `PreloadedMNIST`) instead of transforming every sample.
     """
 
     def __init__(
-        self, data_path: str = "./data", num_workers: int = 4, batch_size: int = 32
+        self,
+        data_path: str = "./data",
+        num_workers: int = 4,
+        batch_size: int = 32,
+        preload: bool = False,
     ):
         """
         Initializes the MNISTDataModule.
@@ -30,11 +125,14 @@ class MNISTDataModule(pl.LightningDataModule):
                 stored.
             num_workers (int): Number of subprocesses to use for data loading.
             batch_size (int): How many samples per batch to load.
+            preload (bool): Whether to serve whole batches from a preloaded
+                tensor instead of transforming every sample.
         """
         super().__init__()
         self.data_path = data_path
         self.num_workers = num_workers
         self.batch_size = batch_size
+        self.preload = preload
         self.train_dataset = None
         self.val_dataset = None
 
@@ -46,6 +144,11 @@ class MNISTDataModule(pl.LightningDataModule):
             stage (Optional[str]): Stage - either 'fit' or 'test'. If None,
                 setup will prepare all datasets.
         """
+        if self.preload:
+            self.train_dataset = PreloadedMNIST(self.data_path, train=True)
+            self.val_dataset = PreloadedMNIST(self.data_path, train=False)
+            return
+
         # Define the transform to apply to each data point
         transform = transforms.Compose([transforms.ToTensor()])
 
@@ -64,10 +167,13 @@ class MNISTDataModule(pl.LightningDataModule):
         Returns:
             DataLoader: The DataLoader for the MNIST training dataset.
         """
+        sampler = self._sampler(self.train_dataset, shuffle=True)
+        if self.preload:
+            return self._batched_dataloader(self.train_dataset, sampler)
         return DataLoader(
             self.train_dataset,
             batch_size=self.batch_size,
-            shuffle=True,
+            sampler=sampler,
             num_workers=self.num_workers,
         )
 
@@ -78,8 +184,49 @@ class MNISTDataModule(pl.LightningDataModule):
         Returns:
             DataLoader: The DataLoader for the MNIST validation dataset.
         """
+        sampler = self._sampler(self.val_dataset, shuffle=False)
+        if self.preload:
+            return self._batched_dataloader(self.val_dataset, sampler)
         return DataLoader(
             self.val_dataset,
             batch_size=self.batch_size,
+            sampler=sampler,
+            num_workers=self.num_workers,
+        )
+
+    @staticmethod
+    def _sampler(dataset: Dataset, shuffle: bool) -> Sampler:
+        """
+        Returns the sampler of the sample indices. In distributed training,
+        a DistributedSampler gives every process its own part of the dataset.
+
+        Args:
+            dataset (Dataset): The dataset to sample from.
+            shuffle (bool): Whether to sample in random order.
+
+        Returns:
+            Sampler: The sampler of the sample indices.
+        """
+        if dist.is_available() and dist.is_initialized() and dist.get_world_size() > 1:
+            return DistributedSampler(dataset, shuffle=shuffle)
+        return RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+
+    def _batched_dataloader(self, dataset: Dataset, sampler: Sampler) -> DataLoader:
+        """
+        Returns a DataLoader which fetches a whole batch of indices from the
+        preloaded dataset at once.
+
+        Args:
+            dataset (Dataset): The preloaded dataset.
+            sampler (Sampler): Sampler of the sample indices.
+
+        Returns:
+            DataLoader: The DataLoader yielding batches of `batch_size`.
+        """
+        return DataLoader(
+            dataset,
+            sampler=_EpochBatchSampler(sampler, batch_size=self.batch_size, drop_last=False),
+            # the dataset already returns whole batches
+            batch_size=None,
             num_workers=self.num_workers,
         )
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+from model.vae import VAE
+
+try:
+    import hnswlib
+except ImportError:  # optional, only needed for the approximate index
+    hnswlib = None
+
+# latent dimensions up to which brute force is used by default
+EXACT_MAX_DIM = 32
+
+# maximum number of distances computed at once by brute force
+QUERY_CHUNK_ELEMENTS = 2**20
+
+
+def _fingerprint(latents: np.ndarray) -> Dict:
+    """
+    Identifies the latents an HNSW graph was built from by their shape and the
+    sha256 hash of their values.
+    """
+    digest = hashlib.sha256(np.ascontiguousarray(latents, dtype=np.float32)).hexdigest()
+    return {"count": int(latents.shape[0]), "dim": int(latents.shape[1]), "sha256": digest}
+
+
+def encode_dataset(
+    model: VAE,
+    dataloader: DataLoader,
+    output_dir: str,
+) -> Tuple[np.memmap, np.ndarray]:
+    """
+    Encodes a dataset into its latent means and stores them as memory-mapped
+    `.npy` files.
+
+    Args:
+        model (VAE): The trained VAE.
+        dataloader (DataLoader): DataLoader over the dataset, ideally with a
+            large batch size and without shuffling.
+        output_dir (str): Directory for `latents.npy` and `labels.npy`.
+
+    Returns:
+        Tuple[np.memmap, np.ndarray]: The latent means of shape
+            (n, latent_dim) and the labels.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    n_samples = len(dataloader.dataset)
+    latents = np.lib.format.open_memmap(
+        os.path.join(output_dir, "latents.npy"),
+        mode="w+",
+        dtype=np.float32,
+        shape=(n_samples, model.hparams.latent_dim),
+    )
+    labels = np.empty(n_samples, dtype=np.int64)
+
+    model.eval()
+    offset = 0
+    with torch.inference_mode():
+        for x, y in dataloader:
+            mean, _ = model.encode(x.view(x.shape[0], -1).to(model.device))
+            latents[offset : offset + len(x)] = mean.cpu().numpy()
+            labels[offset : offset + len(x)] = y.numpy()
+            offset += len(x)
+
+    latents.flush()
+    np.save(os.path.join(output_dir, "labels.npy"), labels)
+    return latents, labels
+
+
+class LatentIndex:
+    """
+    Nearest-neighbour index over the latent means of a dataset.
+
+    For small latent dimensions, queries are answered exactly by brute force:
+    the squared distances to all points are computed as one matrix product,
+    `|q|^2 - 2 q x^T + |x|^2`, followed by a partial sort. For larger latent
+    dimensions, an approximate HNSW graph index (requires `hnswlib`) is used.
+
+    Attributes:
+        latents (np.ndarray): The indexed latent means of shape (n, latent_dim).
+        labels (Optional[np.ndarray]): The labels of the indexed points.
+        method (str): Either 'exact' or 'hnsw'.
+    """
+
+    def __init__(
+        self,
+        latents: np.ndarray,
+        labels: Optional[np.ndarray] = None,
+        method: Optional[str] = None,
+        ef: int = 64,
+        graph_path: Optional[str] = None,
+    ):
+        """
+        Initializes the LatentIndex.
+
+        Args:
+            latents (np.ndarray): Latent means of shape (n, latent_dim).
+            labels (Optional[np.ndarray]): Labels of the points.
+            method (Optional[str]): 'exact' or 'hnsw'. By default, 'exact' is
+                used up to `EXACT_MAX_DIM` latent dimensions.
+            ef (int): Size of the candidate list of HNSW queries. Higher
+                values are slower but more accurate.
+            graph_path (Optional[str]): File in which the HNSW graph is cached.
+                The fingerprint of the latents is stored next to it (with the
+                suffix `.json`), and the graph is rebuilt if the latents changed.
+        """
+        self.latents = latents
+        self.labels = labels
+        if method is None:
+            method = "exact" if latents.shape[1] <= EXACT_MAX_DIM else "hnsw"
+        if method not in ("exact", "hnsw"):
+            raise ValueError(f"Unknown method '{method}', expected 'exact' or 'hnsw'")
+        self.method = method
+
+        if method == "exact":
+            self._squared_norms = np.einsum("ij,ij->i", latents, latents)
+        else:
+            if hnswlib is None:
+                raise ImportError("The 'hnsw' method requires hnswlib: pip install hnswlib")
+            self._graph = hnswlib.Index(space="l2", dim=latents.shape[1])
+            fingerprint = _fingerprint(latents)
+            if graph_path is not None and self._cached_fingerprint(graph_path) == fingerprint:
+                self._graph.load_index(graph_path, max_elements=len(latents))
+            else:
+                self._graph.init_index(max_elements=len(latents), ef_construction=200, M=16)
+                self._graph.add_items(latents, np.arange(len(latents)))
+                if graph_path is not None:
+                    self._graph.save_index(graph_path)
+                    with open(graph_path + ".json", "w") as f:
+                        json.dump(fingerprint, f)
+            self._graph.set_ef(ef)
+
+    @staticmethod
+    def _cached_fingerprint(graph_path: str) -> Optional[Dict]:
+        """Returns the fingerprint of the latents the cached graph was built from, if any."""
+        if not os.path.exists(graph_path):
+            return None
+        try:
+            with open(graph_path + ".json") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def load(cls, index_dir: str, method: Optional[str] = None, **kwargs) -> "LatentIndex":
+        """
+        Loads the latent means written by `encode_dataset` as a memory map.
+
+        Args:
+            index_dir (str): Directory with `latents.npy` and `labels.npy`.
+            method (Optional[str]): 'exact' or 'hnsw', see `__init__`.
+
+        Returns:
+            LatentIndex: The index. An HNSW graph is cached in `index_dir`.
+        """
+        latents = np.load(os.path.join(index_dir, "latents.npy"), mmap_mode="r")
+        labels_path = os.path.join(index_dir, "labels.npy")
+        labels = np.load(labels_path) if os.path.exists(labels_path) else None
+        kwargs.setdefault("graph_path", os.path.join(index_dir, "hnsw.bin"))
+        return cls(latents, labels, method=method, **kwargs)
+
+    def query(self, queries: np.ndarray, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the `k` nearest neighbours of every query.
+
+        Args:
+            queries (np.ndarray): Latent vectors of shape (m, latent_dim), or a
+                single vector of shape (latent_dim,).
+            k (int): Number of neighbours.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Euclidean distances and indices of
+                the neighbours, both of shape (m, k) and sorted by distance.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        k = min(k, len(self.latents))
+
+        if self.method == "hnsw":
+            indices, squared_distances = self._graph.knn_query(queries, k=k)
+            return np.sqrt(squared_distances), indices.astype(np.int64)
+
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        # bounds the distance matrix of a chunk to QUERY_CHUNK_ELEMENTS floats
+        chunk_size = max(1, QUERY_CHUNK_ELEMENTS // len(self.latents))
+        for start in range(0, len(queries), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            distances[chunk], indices[chunk] = self._exact_query(queries[chunk], k)
+        return distances, indices
+
+    def _exact_query(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        squared_distances = (
+            np.einsum("ij,ij->i", queries, queries)[:, None]
+            - 2 * queries @ self.latents.T
+            + self._squared_norms[None, :]
+        )
+        # the k smallest in any order, then sorted, instead of sorting all points
+        indices = np.argpartition(squared_distances, k - 1, axis=1)[:, :k]
+        squared_distances = np.take_along_axis(squared_distances, indices, axis=1)
+        order = np.argsort(squared_distances, axis=1)
+        indices = np.take_along_axis(indices, order, axis=1)
+        # rounding can make the expanded form slightly negative
+        distances = np.sqrt(np.maximum(np.take_along_axis(squared_distances, order, axis=1), 0))
+        return distances, indices
+
+    def outlier_scores(self, queries: np.ndarray, k: int = 10) -> np.ndarray:
+        """
+        Scores how far the queries are from the indexed data, as the mean
+        distance to their `k` nearest neighbours.
+
+        Args:
+            queries (np.ndarray): Latent vectors of shape (m, latent_dim).
+            k (int): Number of neighbours.
+
+        Returns:
+            np.ndarray: One score per query, higher means more unusual.
+        """
+        distances, _ = self.query(queries, k=k)
+        return distances.mean(axis=1)
@@ -1,7 +1,8 @@
+import numpy as np
 import torch
 from torch import nn
 import pytorch_lightning as pl
-from typing import Tuple
+from typing import Optional, Tuple
 
 
 class VAE(pl.LightningModule):
@@ -96,6 +97,51 @@ class VAE(pl.LightningModule):
         """
         return self.decoder(z)
 
+    def decode_latent_grid(
+        self,
+        n: int = 20,
+        value_range: Tuple[float, float] = (-3.0, 3.0),
+        projection: Optional[torch.Tensor] = None,
+        image_shape: Tuple[int, int] = (28, 28),
+        batch_size: int = 4096,
+    ) -> np.ndarray:
+        """
+        Decodes an n x n grid of points in the latent space and tiles the
+        decoded images into one image, e.g. to plot the learned manifold.
+
+        The grid is spanned over the first two latent dimensions, with all other
+        dimensions set to zero, or along the two rows of `projection`. The points
+        are decoded in batches of `batch_size` under inference mode.
+
+        Args:
+            n (int): Number of grid points along each axis.
+            value_range (Tuple[float, float]): Range of the grid coordinates.
+            projection (Optional[torch.Tensor]): Tensor of shape (2, latent_dim)
+                whose rows are the directions of the grid axes.
+            image_shape (Tuple[int, int]): Shape of a decoded image.
+            batch_size (int): Number of points decoded at once.
+
+        Returns:
+            np.ndarray: The tiled images of shape (n * height, n * width). The
+                first coordinate grows to the right, the second to the top.
+        """
+        latent_dim = self.hparams.latent_dim
+        if projection is None:
+            projection = torch.eye(2, latent_dim)
+        if projection.shape != (2, latent_dim):
+            raise ValueError(f"projection must have shape (2, {latent_dim}), got {tuple(projection.shape)}")
+
+        with torch.inference_mode():
+            values = torch.linspace(*value_range, n, device=self.device)
+            # row-major over the tiled image: top row first, so the second coordinate descends
+            grid = torch.stack(torch.meshgrid(values.flip(0), values, indexing="ij"), dim=-1)
+            z = grid.reshape(-1, 2)[:, [1, 0]] @ projection.to(self.device, torch.float32)
+            images = torch.cat([self.decode(chunk) for chunk in z.split(batch_size)])
+
+        height, width = image_shape
+        tiled = images.reshape(n, n, height, width).permute(0, 2, 1, 3).reshape(n * height, n * width)
+        return tiled.float().cpu().numpy()
+
     def forward(
         self, batch: Tuple[torch.Tensor, torch.Tensor]
     ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
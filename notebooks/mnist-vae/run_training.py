@@ -1,24 +1,166 @@
+import math
+import os
+from typing import Optional
+
 import click
 import pytorch_lightning as pl
+from pytorch_lightning.callbacks import ModelCheckpoint
 from pytorch_lightning.loggers import TensorBoardLogger
+from pytorch_lightning.plugins.environments import KubeflowEnvironment
+from pytorch_lightning.strategies import DDPStrategy
 from model.vae import VAE
 from model.datamodule import MNISTDataModule
+from model.callbacks import ThroughputCallback, TrainingProfilerCallback
+from model.checkpoint_io import SnapshotAsyncCheckpointIO
 import torch
 
+
+def cpus_per_process() -> int:
+    """
+    Returns the number of CPUs available to this process.
+
+    These are the CPUs the process may run on, limited by the CPU quota of its
+    cgroup (e.g. the CPU limit of a pod), and shared by the LOCAL_WORLD_SIZE
+    processes of distributed training on this node. os.cpu_count() counts all
+    CPUs of the host instead.
+
+    Returns:
+        int: Number of CPUs, at least 1.
+    """
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    quota = None
+    try:
+        # cgroup v2, "max 100000" without a limit
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            limit, period = f.read().split()
+        if limit != 'max':
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1, a quota of -1 means no limit
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        cpus = min(cpus, max(int(quota), 1))
+    return max(cpus // int(os.environ.get('LOCAL_WORLD_SIZE', 1)), 1)
+
+
+# settings of --performance, tuned for CPU-only nodes. torch.compile is left out, as
+# it made training of this small model slower on CPU, see README.md
+PERFORMANCE_PROFILE = dict(
+    batch_size=256,
+    compile=False,
+    precision='bf16-mixed',
+    num_threads=cpus_per_process(),
+    num_interop_threads=1,
+)
+
+BASE_BATCH_SIZE = 32
+BASE_LEARNING_RATE = 0.001
+
+
 @click.command()
 @click.option('--hidden_dim', default=400, type=int, help='Dimension of the hidden layer.')
 @click.option('--latent_dim', default=2, type=int, help='Dimension of the latent space.')
-def run(hidden_dim: int, latent_dim: int) -> None:
+@click.option('--preload/--no-preload', default=True, help='Serve batches from a preloaded MNIST tensor.')
+@click.option('--data_path', default='./data', type=str, help='Directory of the MNIST data.')
+@click.option('--max_epochs', default=50, type=int, help='Number of epochs to train.')
+@click.option('--max_steps', default=-1, type=int, help='Stop after this many steps (-1 for no limit).')
+@click.option('--performance', is_flag=True, help='Use the CPU performance profile, see PERFORMANCE_PROFILE.')
+@click.option('--batch_size', default=None, type=int, help='Batch size (default 32, or 256 with --performance).')
+@click.option('--learning_rate', default=None, type=float,
+              help='Learning rate (default 0.001, scaled with the square root of batch_size / 32).')
+@click.option('--compile/--no-compile', 'compile_model', default=None, help='torch.compile the encoder and decoder.')
+@click.option('--precision', default=None, type=click.Choice(['32-true', 'bf16-mixed']), help='Training precision.')
+@click.option('--num_threads', default=None, type=int, help='Number of intra-op threads.')
+@click.option('--num_interop_threads', default=None, type=int, help='Number of inter-op threads.')
+@click.option('--profiling', is_flag=True, help='Log step time breakdown, samples/s and peak memory to TensorBoard.')
+@click.option('--trace_steps', default=0, type=int, help='Trace this many steps with torch.profiler (needs --profiling).')
+@click.option('--checkpoint_dir', default='tb_logs/mnist-vae/checkpoints', type=str,
+              help='Directory or object storage URL (e.g. s3://bucket/prefix) of the checkpoints.')
+@click.option('--checkpoint_every_n_steps', default=500, type=int, help='Save a checkpoint every this many steps.')
+@click.option('--keep_checkpoints', default=3, type=int, help='Number of checkpoints kept besides last.ckpt.')
+@click.option('--resume/--no-resume', default=True, help='Resume from last.ckpt in checkpoint_dir if it exists.')
+def run(
+    hidden_dim: int,
+    latent_dim: int,
+    preload: bool,
+    data_path: str,
+    max_epochs: int,
+    max_steps: int,
+    performance: bool,
+    batch_size: Optional[int],
+    learning_rate: Optional[float],
+    compile_model: Optional[bool],
+    precision: Optional[str],
+    num_threads: Optional[int],
+    num_interop_threads: Optional[int],
+    profiling: bool,
+    trace_steps: int,
+    checkpoint_dir: str,
+    checkpoint_every_n_steps: int,
+    keep_checkpoints: int,
+    resume: bool,
+) -> None:
     """
     Train a VAE model on the MNIST dataset using PyTorch Lightning.
 
     Args:
         hidden_dim (int): Dimension of the hidden layer.
         latent_dim (int): Dimension of the latent space.
+        preload (bool): Whether to serve batches from a preloaded MNIST tensor.
+        data_path (str): Directory of the MNIST data.
+        max_epochs (int): Number of epochs to train.
+        max_steps (int): Number of steps after which training stops, -1 for no limit.
+        performance (bool): Whether to use the CPU performance profile. Options
+            given explicitly take precedence over the profile.
+        batch_size (Optional[int]): Batch size.
+        learning_rate (Optional[float]): Learning rate. By default, it grows with
+            the square root of the batch size, which suits Adam better than
+            linear scaling.
+        compile_model (Optional[bool]): Whether to torch.compile the encoder and decoder.
+        precision (Optional[str]): Training precision, '32-true' or 'bf16-mixed'.
+        num_threads (Optional[int]): Number of intra-op threads.
+        num_interop_threads (Optional[int]): Number of inter-op threads.
+        profiling (bool): Whether to log where the time of the training steps goes,
+            see TrainingProfilerCallback.
+        trace_steps (int): Number of steps traced with torch.profiler, 0 for none.
+        checkpoint_dir (str): Directory or object storage URL of the checkpoints. It
+            isn't versioned like the logs, so that a restarted run finds them.
+        checkpoint_every_n_steps (int): Number of steps between checkpoints.
+        keep_checkpoints (int): Number of most recent checkpoints kept besides last.ckpt.
+        resume (bool): Whether to resume from last.ckpt in checkpoint_dir if it exists.
     """
+    # Distributed training is configured by the environment variables set by torchrun or a
+    # PyTorchJob: WORLD_SIZE processes in total, LOCAL_WORLD_SIZE of them on this node
+    world_size = int(os.environ.get('WORLD_SIZE', 1))
+    devices = int(os.environ.get('LOCAL_WORLD_SIZE', 1))
+
+    profile = PERFORMANCE_PROFILE if performance else {}
+    batch_size = batch_size or profile.get('batch_size', BASE_BATCH_SIZE)
+    if learning_rate is None:
+        # every process trains on batch_size samples per step
+        learning_rate = BASE_LEARNING_RATE * math.sqrt(batch_size * world_size / BASE_BATCH_SIZE)
+    if compile_model is None:
+        compile_model = profile.get('compile', False)
+    precision = precision or profile.get('precision', '32-true')
+    num_threads = num_threads or profile.get('num_threads')
+    num_interop_threads = num_interop_threads or profile.get('num_interop_threads')
+
+    # must happen before any parallel work has started
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads:
+        torch.set_num_interop_threads(num_interop_threads)
 
     # Initialize data module
-    dm = MNISTDataModule(data_path="./data", num_workers=0, batch_size=32)
+    dm = MNISTDataModule(data_path=data_path, num_workers=0, batch_size=batch_size, preload=preload)
     dm.setup()
 
     # Initialize model
@@ -26,21 +168,63 @@ def run(hidden_dim: int, latent_dim: int) -> None:
         input_dim=784, # 28x28 pixels
         hidden_dim=hidden_dim, # Dimension of the hidden layer
         latent_dim=latent_dim,  # Dimension of the latent space
+        learning_rate=learning_rate,
     )
+    if compile_model:
+        # compiles the forward methods only, so the checkpoint keys stay the same (torch.compile
+        # of the modules would prefix them with _orig_mod, and nn.Module.compile needs torch 2.2)
+        model.encoder.forward = torch.compile(model.encoder.forward)
+        model.decoder.forward = torch.compile(model.decoder.forward)
 
     # Initialize logger
     logger = TensorBoardLogger("tb_logs", name="mnist-vae")
 
     # Initialize trainer
+    if world_size > 1:
+        # torchrun is detected by Lightning, the one process per pod of a PyTorchJob is not
+        cluster_environment = None if 'TORCHELASTIC_RUN_ID' in os.environ else KubeflowEnvironment()
+        distributed = dict(
+            accelerator="cpu",
+            devices=devices,
+            num_nodes=world_size // devices,
+            strategy=DDPStrategy(process_group_backend="gloo", cluster_environment=cluster_environment),
+            # MNISTDataModule uses a DistributedSampler itself
+            use_distributed_sampler=False,
+        )
+    else:
+        distributed = dict(accelerator="gpu" if torch.cuda.is_available() else "cpu", devices=1)
+    # the newest keep_checkpoints checkpoints are kept, plus a copy as last.ckpt to resume from
+    checkpoint_callback = ModelCheckpoint(
+        dirpath=checkpoint_dir,
+        monitor='step',
+        mode='max',
+        save_top_k=keep_checkpoints,
+        save_last=True,
+        every_n_train_steps=checkpoint_every_n_steps,
+    )
+    callbacks = [ThroughputCallback(), checkpoint_callback]
+    if profiling:
+        callbacks.append(TrainingProfilerCallback(trace_steps=trace_steps))
     trainer = pl.Trainer(
-        max_epochs=50,
-        accelerator="gpu" if torch.cuda.is_available() else "cpu",
-        devices=1,
-        logger=logger
+        max_epochs=max_epochs,
+        max_steps=max_steps,
+        precision=precision,
+        logger=logger,
+        callbacks=callbacks,
+        # copies the state to CPU memory and writes the copy on a background thread,
+        # so the training loop only waits for the copy
+        plugins=[SnapshotAsyncCheckpointIO()],
+        **distributed,
+    )
+
+    print(
+        f"batch_size={batch_size} learning_rate={learning_rate:g} compile={compile_model} "
+        f"precision={precision} threads={torch.get_num_threads()}/{torch.get_num_interop_threads()} "
+        f"world_size={world_size}"
     )
 
-    # Start training
-    trainer.fit(model=model, datamodule=dm)
+    # Start training, "last" is ignored with a warning if there is no last.ckpt yet
+    trainer.fit(model=model, datamodule=dm, ckpt_path='last' if resume else None)
 
 if __name__ == '__main__':
     run()
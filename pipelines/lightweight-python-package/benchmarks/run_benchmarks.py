@@ -0,0 +1,210 @@
+"""
+Benchmarks every stage of the mobile price classification pipeline on synthetic data.
+
+For each dataset size, synthetic `train.csv` and `test.csv` files are generated and the
+package functions run one after another, each in a fresh process so that peak memory is
+measured per stage. Time and memory are measured with `profiling.profile_step`. SVC
+training scales quadratically, so `tune_hyperparams` and `train_model` only use a random
+subsample of at most `--max-svm-rows` training rows, while all other stages use all rows.
+
+The results are stored as JSON together with the git commit, so that regressions can be
+spotted by comparing against the results of an earlier commit with `--baseline`.
+
+Usage:
+    python run_benchmarks.py --sizes 10000 100000 1000000 10000000
+    python run_benchmarks.py --sizes 10000 100000 --baseline benchmark-1a2b3c4d.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from mobile_price_classification import (
+    read_data,
+    split_data,
+    fit_scaler,
+    tune_hyperparams,
+    train_model,
+    evaluate_model,
+    test_model,
+)
+from mobile_price_classification.profiling import profile_step
+from synthetic_data import write_synthetic_dataset
+
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# smaller than the pipeline's default grid, to keep the benchmark affordable
+BENCHMARK_GRID = dict(C=[0.5, 1, 2], kernel=["linear", "rbf"], gamma=["auto"], decision_function_shape=["ovr"])
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _run_isolated(func, **kwargs):
+    """Runs `profile_step(func, **kwargs)` in a new process and returns its result."""
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(profile_step, func, **kwargs).result()
+
+
+def _subsample(path: str, output_path: str, max_rows: int, seed: int) -> int:
+    df = pd.read_parquet(path)
+    if len(df) > max_rows:
+        df = df.sample(n=max_rows, random_state=seed)
+    df.to_parquet(output_path)
+    return len(df)
+
+
+def benchmark_size(n_rows: int, work_dir: str, max_svm_rows: int, seed: int = 42) -> list:
+    """Benchmarks all stages on `n_rows` synthetic training rows, returns one record per stage."""
+
+    def artifact(name: str) -> str:
+        return os.path.join(work_dir, name)
+
+    train_csv, test_csv = write_synthetic_dataset(work_dir, n_rows, seed)
+
+    records = []
+
+    def run(stage: str, func, **kwargs):
+        print(f"[benchmark] {n_rows} rows: {stage}")
+        result, stats = _run_isolated(func, **kwargs)
+        records.append({"rows": n_rows, "stage": stage, **stats})
+        return result
+
+    run(
+        "read_data",
+        read_data,
+        minio_train_data_path=train_csv,
+        minio_test_data_path=test_csv,
+        train_output_path=artifact("train_df.parquet"),
+        test_output_path=artifact("test_df.parquet"),
+    )
+    run(
+        "split_data",
+        split_data,
+        train_df_path=artifact("train_df.parquet"),
+        x_train_output_path=artifact("x_train_df.parquet"),
+        y_train_output_path=artifact("y_train_df.parquet"),
+        x_val_output_path=artifact("x_val_df.parquet"),
+        y_val_output_path=artifact("y_val_df.parquet"),
+        seed=seed,
+    )
+    run(
+        "fit_scaler",
+        fit_scaler,
+        train_x_path=artifact("x_train_df.parquet"),
+        fitted_scaler_output_path=artifact("fitted_scaler.joblib"),
+    )
+
+    # x and y were split together, so the same random_state selects matching rows
+    _subsample(artifact("x_train_df.parquet"), artifact("x_svm.parquet"), max_svm_rows, seed)
+    _subsample(artifact("y_train_df.parquet"), artifact("y_svm.parquet"), max_svm_rows, seed)
+
+    hparams = run(
+        "tune_hyperparams",
+        tune_hyperparams,
+        train_x_path=artifact("x_svm.parquet"),
+        train_y_path=artifact("y_svm.parquet"),
+        fitted_scaler_path=artifact("fitted_scaler.joblib"),
+        seed=seed,
+        **BENCHMARK_GRID,
+    )
+    run(
+        "train_model",
+        train_model,
+        train_x_path=artifact("x_svm.parquet"),
+        train_y_path=artifact("y_svm.parquet"),
+        fitted_scaler_path=artifact("fitted_scaler.joblib"),
+        hparams=hparams,
+        trained_model_output_path=artifact("trained_model.joblib"),
+        seed=seed,
+    )
+    run(
+        "evaluate_model",
+        evaluate_model,
+        val_x_path=artifact("x_val_df.parquet"),
+        val_y_path=artifact("y_val_df.parquet"),
+        fitted_scaler_path=artifact("fitted_scaler.joblib"),
+        trained_model_path=artifact("trained_model.joblib"),
+        classification_report_output_path=artifact("classification_report.md"),
+    )
+    run(
+        "test_model",
+        test_model,
+        test_x_path=artifact("test_df.parquet"),
+        trained_model_path=artifact("trained_model.joblib"),
+        fitted_scaler_path=artifact("fitted_scaler.joblib"),
+        column_x="ram",
+        column_y="battery_power",
+        scatter_plot_output_path=artifact("scatter_plot.html"),
+    )
+    return records
+
+
+def compare(results: dict, baseline: dict):
+    """Prints the relative change of wall time and peak memory against a baseline run."""
+    baseline_records = {(r["rows"], r["stage"]): r for r in baseline["results"]}
+    print(f"\nComparison against {baseline['commit'][:8]} (positive = slower / more memory)")
+    print(f"{'rows':>10} {'stage':<18}{'wall time':>12}{'peak rss':>12}")
+    for record in results["results"]:
+        base = baseline_records.get((record["rows"], record["stage"]))
+        if base is None:
+            continue
+        changes = [
+            (record[metric] - base[metric]) / base[metric] * 100 if base[metric] else 0.0
+            for metric in ("wall_time_seconds", "peak_rss_mb")
+        ]
+        print(f"{record['rows']:>10} {record['stage']:<18}" + "".join(f"{c:>+11.1f}%" for c in changes))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Numbers of training rows.")
+    parser.add_argument("--max-svm-rows", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Defaults to benchmark-<commit>.json.")
+    parser.add_argument("--baseline", default=None, help="Results of an earlier run to compare against.")
+    args = parser.parse_args()
+
+    commit = _git_commit()
+    results = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "max_svm_rows": args.max_svm_rows,
+        "results": [],
+    }
+
+    for n_rows in args.sizes:
+        with tempfile.TemporaryDirectory(prefix="mobile-price-benchmark-") as work_dir:
+            results["results"].extend(benchmark_size(n_rows, work_dir, args.max_svm_rows, args.seed))
+
+    output = args.output or f"benchmark-{commit[:8]}.json"
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n{'rows':>10} {'stage':<18}{'seconds':>10}{'peak rss MB':>14}{'rows/s':>14}")
+    for record in results["results"]:
+        print(
+            f"{record['rows']:>10} {record['stage']:<18}{record['wall_time_seconds']:>10.2f}"
+            f"{record['peak_rss_mb']:>14.1f}{record['rows_per_second']:>14.0f}"
+        )
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
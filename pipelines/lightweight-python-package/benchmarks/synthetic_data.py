@@ -0,0 +1,119 @@
+"""
+Generates synthetic data with the same schema as the Kaggle mobile price classification dataset.
+
+The Kaggle dataset only has 2000 training rows, so scaling problems never show up with it.
+The generated `train.csv` contains the 20 features and `price_range`, `test.csv` contains
+an `id` column and the features, just like the original files. `price_range` mostly
+depends on `ram`, `battery_power` and the pixel resolution, as in the original data,
+and the four classes are roughly balanced.
+
+Usage:
+    python synthetic_data.py --rows 1000000 --output-dir ./data
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# (low, high) of the integer features, high is inclusive
+INTEGER_FEATURES = {
+    "battery_power": (501, 1998),
+    "blue": (0, 1),
+    "dual_sim": (0, 1),
+    "fc": (0, 19),
+    "four_g": (0, 1),
+    "int_memory": (2, 64),
+    "mobile_wt": (80, 200),
+    "n_cores": (1, 8),
+    "pc": (0, 20),
+    "px_height": (0, 1960),
+    "px_width": (500, 1998),
+    "ram": (256, 3998),
+    "sc_h": (5, 19),
+    "sc_w": (0, 18),
+    "talk_time": (2, 20),
+    "three_g": (0, 1),
+    "touch_screen": (0, 1),
+    "wifi": (0, 1),
+}
+
+# (low, high) of the features with one decimal place
+DECIMAL_FEATURES = {
+    "clock_speed": (0.5, 3.0),
+    "m_dep": (0.1, 1.0),
+}
+
+# column order of the Kaggle dataset
+FEATURE_COLUMNS = [
+    "battery_power", "blue", "clock_speed", "dual_sim", "fc", "four_g", "int_memory", "m_dep", "mobile_wt",
+    "n_cores", "pc", "px_height", "px_width", "ram", "sc_h", "sc_w", "talk_time", "three_g", "touch_screen", "wifi",
+]
+
+CHUNK_ROWS = 1_000_000
+
+
+def _features(rng: np.random.Generator, n_rows: int) -> pd.DataFrame:
+    data = {
+        name: rng.integers(low, high + 1, n_rows) for name, (low, high) in INTEGER_FEATURES.items()
+    }
+    data.update(
+        {name: rng.uniform(low, high, n_rows).round(1) for name, (low, high) in DECIMAL_FEATURES.items()}
+    )
+    return pd.DataFrame(data)[FEATURE_COLUMNS]
+
+
+def _price_score(features: pd.DataFrame, rng: np.random.Generator) -> np.ndarray:
+    return (
+        3.0 * features["ram"] / 4000
+        + 0.6 * features["battery_power"] / 2000
+        + 0.3 * (features["px_height"] * features["px_width"]) / (1960 * 2000)
+        + rng.normal(0, 0.15, len(features))
+    ).values
+
+
+def _class_thresholds(seed: int) -> np.ndarray:
+    """Quantiles of the price score, so that the classes are balanced in every chunk."""
+    rng = np.random.default_rng(seed)
+    score = _price_score(_features(rng, 100_000), rng)
+    return np.quantile(score, [0.25, 0.5, 0.75])
+
+
+def generate_chunks(n_rows: int, with_labels: bool, seed: int = 42, chunk_rows: int = CHUNK_ROWS):
+    """Yields DataFrames of at most `chunk_rows` rows, `n_rows` in total."""
+    thresholds = _class_thresholds(seed)
+    # different seed for train and test data
+    rng = np.random.default_rng([seed, int(with_labels)])
+    for offset in range(0, n_rows, chunk_rows):
+        chunk = _features(rng, min(chunk_rows, n_rows - offset))
+        if with_labels:
+            chunk["price_range"] = np.digitize(_price_score(chunk, rng), thresholds)
+        else:
+            chunk.insert(0, "id", np.arange(offset + 1, offset + len(chunk) + 1))
+        yield chunk
+
+
+def write_synthetic_dataset(output_dir: str, n_rows: int, seed: int = 42) -> tuple:
+    """
+    Writes `train.csv` with `n_rows` rows and `test.csv` with `n_rows // 2` rows to `output_dir`,
+    chunk by chunk so that memory stays bounded. Returns the paths of both files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for name, rows, with_labels in [("train.csv", n_rows, True), ("test.csv", max(1, n_rows // 2), False)]:
+        path = os.path.join(output_dir, name)
+        for i, chunk in enumerate(generate_chunks(rows, with_labels, seed)):
+            chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        paths.append(path)
+    return tuple(paths)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, required=True, help="Number of training rows.")
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(write_synthetic_dataset(args.output_dir, args.rows, args.seed))
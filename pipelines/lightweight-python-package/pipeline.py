@@ -1,11 +1,14 @@
 from typing import Dict, List
 
 from kfp import dsl
-from kfp.dsl import HTML, Input, Output, Dataset, Artifact, Model, ClassificationMetrics, Markdown
+from kfp.dsl import HTML, Input, Output, Dataset, Artifact, Model, ClassificationMetrics, Markdown, Metrics
 
 
 COMPONENTS_IMAGE = "europe-west3-docker.pkg.dev/prokube-internal/prokube-customer/mobile-price-classification:v1"
 
+# Maximum number of tuning shards that run at the same time in the fan-out pipeline
+TUNING_PARALLELISM = 4
+
 
 @dsl.component(base_image=COMPONENTS_IMAGE)
 def read_data(
@@ -13,11 +16,15 @@ def read_data(
     minio_test_data_path: str,
     train_df: Output[Dataset],
     test_df: Output[Dataset],
+    metrics: Output[Metrics],
 ):
     """Reads training and test data and writes it to pipeline artifacts as parquet."""
     from mobile_price_classification import read_data as _read_data
+    from mobile_price_classification.profiling import profile_step
 
-    _read_data(
+    profile_step(
+        _read_data,
+        log_metric=metrics.log_metric,
         minio_train_data_path=minio_train_data_path,
         minio_test_data_path=minio_test_data_path,
         train_output_path=train_df.path,
@@ -32,13 +39,17 @@ def split_data(
     y_train_df: Output[Dataset],
     x_val_df: Output[Dataset],
     y_val_df: Output[Dataset],
+    metrics: Output[Metrics],
     test_size: float = 0.5,
     seed: int = 42,
 ):
     """Splits the provided dataset into training and validation sets."""
     from mobile_price_classification import split_data as _split_data
+    from mobile_price_classification.profiling import profile_step
 
-    _split_data(
+    profile_step(
+        _split_data,
+        log_metric=metrics.log_metric,
         train_df_path=train_df.path,
         x_train_output_path=x_train_df.path,
         y_train_output_path=y_train_df.path,
@@ -50,11 +61,18 @@ def split_data(
 
 
 @dsl.component(base_image=COMPONENTS_IMAGE)
-def fit_scaler(train_x: Input[Dataset], fitted_scaler: Output[Artifact]):
+def fit_scaler(
+    train_x: Input[Dataset],
+    fitted_scaler: Output[Artifact],
+    metrics: Output[Metrics],
+):
     """Fits a MinMaxScaler on the provided training data and saves the fitted scaler."""
     from mobile_price_classification import fit_scaler as _fit_scaler
+    from mobile_price_classification.profiling import profile_step
 
-    _fit_scaler(
+    profile_step(
+        _fit_scaler,
+        log_metric=metrics.log_metric,
         train_x_path=train_x.path,
         fitted_scaler_output_path=fitted_scaler.path,
     )
@@ -65,16 +83,26 @@ def tune_hyperparams(
     train_x: Input[Dataset],
     train_y: Input[Dataset],
     fitted_scaler: Input[Artifact],
+    metrics: Output[Metrics],
     C: List = [1, 0.1, 0.25, 0.5, 2, 0.75],
     kernel: List = ["linear", "rbf"],
     gamma: List = ["auto", 0.01, 0.001, 0.0001, 1],
     decision_function_shape: List[str] = ["ovo", "ovr"],
     seed: int = 42,
+    dask_scheduler_address: str = "",
+    max_tuning_rows: int = 0,
 ) -> dict:
-    """Performs hyperparameter tuning using GridSearchCV for an SVM classifier."""
+    """
+    Performs a cross-validated grid search for an SVM classifier, fitting each distinct model once.
+    If a Dask scheduler address is given, the search runs on that Dask cluster.
+    If `max_tuning_rows` is greater than 0, the search runs on a stratified subsample of that many rows.
+    """
     from mobile_price_classification import tune_hyperparams as _tune_hyperparams
+    from mobile_price_classification.profiling import profile_step
 
-    return _tune_hyperparams(
+    best_params, _ = profile_step(
+        _tune_hyperparams,
+        log_metric=metrics.log_metric,
         train_x_path=train_x.path,
         train_y_path=train_y.path,
         fitted_scaler_path=fitted_scaler.path,
@@ -83,8 +111,89 @@ def tune_hyperparams(
         gamma=gamma,
         decision_function_shape=decision_function_shape,
         seed=seed,
+        dask_scheduler_address=dask_scheduler_address or None,
+        max_tuning_rows=max_tuning_rows or None,
     )
 
+    return best_params
+
+
+@dsl.component(base_image=COMPONENTS_IMAGE)
+def shard_param_grid(
+    C: List,
+    kernel: List,
+    gamma: List,
+    decision_function_shape: List[str],
+    num_shards: int,
+    metrics: Output[Metrics],
+) -> List:
+    """Partitions the hyperparameter grid into shards that can be evaluated in parallel."""
+    from mobile_price_classification import shard_param_grid as _shard_param_grid
+    from mobile_price_classification.profiling import profile_step
+
+    shards, _ = profile_step(
+        _shard_param_grid,
+        log_metric=metrics.log_metric,
+        C=C,
+        kernel=kernel,
+        gamma=gamma,
+        decision_function_shape=decision_function_shape,
+        num_shards=num_shards,
+    )
+
+    return shards
+
+
+@dsl.component(base_image=COMPONENTS_IMAGE)
+def evaluate_param_shard(
+    train_x: Input[Dataset],
+    train_y: Input[Dataset],
+    fitted_scaler: Input[Artifact],
+    shard: List,
+    metrics: Output[Metrics],
+    seed: int = 42,
+    max_tuning_rows: int = 0,
+) -> List:
+    """
+    Cross-validates all hyperparameter candidates of one shard, on a stratified subsample
+    of `max_tuning_rows` rows if it is greater than 0.
+    """
+    from mobile_price_classification import evaluate_param_shard as _evaluate_param_shard
+    from mobile_price_classification.profiling import profile_step
+
+    shard_results, _ = profile_step(
+        _evaluate_param_shard,
+        log_metric=metrics.log_metric,
+        train_x_path=train_x.path,
+        train_y_path=train_y.path,
+        fitted_scaler_path=fitted_scaler.path,
+        shard=shard,
+        seed=seed,
+        max_tuning_rows=max_tuning_rows or None,
+    )
+
+    return shard_results
+
+
+@dsl.component(base_image=COMPONENTS_IMAGE)
+def select_best_params(
+    shard_results: List,
+    leaderboard_md: Output[Markdown],
+    metrics: Output[Metrics],
+) -> dict:
+    """Merges the shard results into a leaderboard and returns the best hyperparameters."""
+    from mobile_price_classification import select_best_params as _select_best_params
+    from mobile_price_classification.profiling import profile_step
+
+    best_params, _ = profile_step(
+        _select_best_params,
+        log_metric=metrics.log_metric,
+        shard_results=shard_results,
+        leaderboard_output_path=leaderboard_md.path,
+    )
+
+    return best_params
+
 
 @dsl.component(base_image=COMPONENTS_IMAGE)
 def train_model(
@@ -93,18 +202,36 @@ def train_model(
     fitted_scaler: Input[Artifact],
     hparams: Dict,
     trained_model: Output[Model],
+    metrics: Output[Metrics],
     seed: int = 42,
+    trainer: str = "svc",
 ):
-    """Trains an SVM classifier using the best hyperparameters from tuning."""
+    """
+    Trains an SVM classifier using the best hyperparameters from tuning.
+
+    With `trainer="svc"` an exact SVC is trained in memory. With `trainer="rbf_sampler"` or
+    `trainer="nystroem"` an approximate kernel SVM is trained out of core instead, see
+    `train_model_out_of_core`.
+    """
     from mobile_price_classification import train_model as _train_model
+    from mobile_price_classification import train_model_out_of_core as _train_model_out_of_core
+    from mobile_price_classification.profiling import profile_step
 
-    _train_model(
+    if trainer == "svc":
+        func, kwargs = _train_model, {}
+    else:
+        func, kwargs = _train_model_out_of_core, {"feature_map": trainer}
+
+    profile_step(
+        func,
+        log_metric=metrics.log_metric,
         train_x_path=train_x.path,
         train_y_path=train_y.path,
         fitted_scaler_path=fitted_scaler.path,
         hparams=hparams,
         trained_model_output_path=trained_model.path,
         seed=seed,
+        **kwargs,
     )
 
 
@@ -116,16 +243,24 @@ def evaluate_model(
     trained_model: Input[Model],
     confusion_matrix_plot: Output[ClassificationMetrics],
     classification_report_md: Output[Markdown],
+    metrics: Output[Metrics],
+    chunk_size: int = 10000,
+    n_jobs: int = -1,
 ):
-    """Evaluates the trained SVM model using validation data."""
+    """Evaluates the trained SVM model using validation data, predicting in parallel chunks."""
     from mobile_price_classification import evaluate_model as _evaluate_model
+    from mobile_price_classification.profiling import profile_step
 
-    result = _evaluate_model(
+    result, _ = profile_step(
+        _evaluate_model,
+        log_metric=metrics.log_metric,
         val_x_path=val_x.path,
         val_y_path=val_y.path,
         fitted_scaler_path=fitted_scaler.path,
         trained_model_path=trained_model.path,
         classification_report_output_path=classification_report_md.path,
+        chunk_size=chunk_size,
+        n_jobs=n_jobs,
     )
 
     confusion_matrix_plot.log_confusion_matrix(result["labels"], result["matrix"])
@@ -139,17 +274,38 @@ def test_model(
     column_x: str,
     column_y: str,
     scatter_plot: Output[HTML],
+    predictions: Output[Dataset],
+    metrics: Output[Metrics],
+    chunk_size: int = 10000,
+    n_jobs: int = -1,
+    render_mode: str = "webgl",
+    max_points_per_class: int = 20000,
+    density_threshold: int = 0,
 ):
-    """Test a trained SVM model on test data and produce a scatter plot."""
+    """
+    Test a trained SVM model on test data and produce a scatter plot.
+    Predictions are made in parallel chunks and streamed to the predictions dataset.
+    The plot shows a stratified sample of at most `max_points_per_class` points per class
+    and, above `density_threshold` rows, a density aggregate of all rows.
+    """
     from mobile_price_classification import test_model as _test_model
+    from mobile_price_classification.profiling import profile_step
 
-    _test_model(
+    profile_step(
+        _test_model,
+        log_metric=metrics.log_metric,
         test_x_path=test_x.path,
         trained_model_path=trained_model.path,
         fitted_scaler_path=fitted_scaler.path,
         column_x=column_x,
         column_y=column_y,
         scatter_plot_output_path=scatter_plot.path,
+        chunk_size=chunk_size,
+        n_jobs=n_jobs,
+        predictions_output_path=predictions.path,
+        render_mode=render_mode,
+        max_points_per_class=max_points_per_class,
+        density_threshold=density_threshold,
     )
 
 
@@ -165,6 +321,9 @@ def mobile_price_classification_pipeline(
     scatter_plot_column_x: str = "ram",
     scatter_plot_column_y: str = "battery_power",
     seed: int = 42,
+    dask_scheduler_address: str = "",
+    trainer: str = "svc",
+    max_tuning_rows: int = 20000,
 ):
     """
     Mobile price classification pipeline using containerized components.
@@ -214,15 +373,122 @@ def mobile_price_classification_pipeline(
         gamma=gamma,
         decision_function_shape=decision_function_shape,
         seed=seed,
+        dask_scheduler_address=dask_scheduler_address,
+        max_tuning_rows=max_tuning_rows,
+    )
+
+    # Step 5: Train the model
+    train_model_task = train_model(
+        train_x=split_data_task.outputs["x_train_df"],
+        train_y=split_data_task.outputs["y_train_df"],
+        hparams=tune_hyperparams_task.outputs["Output"],
+        fitted_scaler=fit_scaler_task.outputs["fitted_scaler"],
+        seed=seed,
+        trainer=trainer,
+    )
+
+    # Step 6: Evaluate the model
+    evaluate_model_task = evaluate_model(
+        val_x=split_data_task.outputs["x_val_df"],
+        val_y=split_data_task.outputs["y_val_df"],
+        trained_model=train_model_task.outputs["trained_model"],
+        fitted_scaler=fit_scaler_task.outputs["fitted_scaler"],
+    )
+
+    # Step 7: Test the model and visualize
+    test_model_task = test_model(
+        test_x=read_data_task.outputs["test_df"],
+        trained_model=train_model_task.outputs["trained_model"],
+        fitted_scaler=fit_scaler_task.outputs["fitted_scaler"],
+        column_x=scatter_plot_column_x,
+        column_y=scatter_plot_column_y,
+    )
+
+
+@dsl.pipeline
+def mobile_price_classification_fanout_pipeline(
+    minio_train_data_path: str,
+    minio_test_data_path: str,
+    test_size: float = 0.5,
+    C: List = [1, 0.1, 0.25, 0.5, 2, 0.75],
+    kernel: List = ["linear", "rbf"],
+    gamma: List = ["auto", 0.01, 0.001, 0.0001, 1],
+    decision_function_shape: List[str] = ["ovo", "ovr"],
+    num_tuning_shards: int = 4,
+    scatter_plot_column_x: str = "ram",
+    scatter_plot_column_y: str = "battery_power",
+    seed: int = 42,
+    trainer: str = "svc",
+    max_tuning_rows: int = 20000,
+):
+    """
+    Variant of the mobile price classification pipeline with fan-out hyperparameter tuning.
+
+    Instead of evaluating the whole grid in a single pod, the grid is partitioned into
+    `num_tuning_shards` shards which are evaluated in parallel tasks (at most
+    `TUNING_PARALLELISM` at a time). A reduce step picks the best hyperparameters and
+    writes a leaderboard. All other steps are the same as in
+    `mobile_price_classification_pipeline`.
+    """
+    from kfp import kubernetes
+
+    # Step 1: Read the data
+    read_data_task = read_data(
+        minio_train_data_path=minio_train_data_path,
+        minio_test_data_path=minio_test_data_path,
+    )
+    kubernetes.use_secret_as_env(
+        read_data_task,
+        secret_name="s3creds",
+        secret_key_to_env={
+            "AWS_ACCESS_KEY_ID": "AWS_ACCESS_KEY_ID",
+            "AWS_SECRET_ACCESS_KEY": "AWS_SECRET_ACCESS_KEY",
+        },
+    )
+
+    # Step 2: Split the data
+    split_data_task = split_data(
+        train_df=read_data_task.outputs["train_df"],
+        test_size=test_size,
+        seed=seed,
+    )
+
+    # Step 3: Fit the scaler
+    fit_scaler_task = fit_scaler(train_x=split_data_task.outputs["x_train_df"])
+
+    # Step 4: Tune hyperparameters - partition the grid, evaluate the shards in parallel, reduce
+    shard_param_grid_task = shard_param_grid(
+        C=C,
+        kernel=kernel,
+        gamma=gamma,
+        decision_function_shape=decision_function_shape,
+        num_shards=num_tuning_shards,
+    )
+
+    with dsl.ParallelFor(
+        items=shard_param_grid_task.outputs["Output"], parallelism=TUNING_PARALLELISM
+    ) as shard:
+        evaluate_param_shard_task = evaluate_param_shard(
+            train_x=split_data_task.outputs["x_train_df"],
+            train_y=split_data_task.outputs["y_train_df"],
+            fitted_scaler=fit_scaler_task.outputs["fitted_scaler"],
+            shard=shard,
+            seed=seed,
+            max_tuning_rows=max_tuning_rows,
+        )
+
+    select_best_params_task = select_best_params(
+        shard_results=dsl.Collected(evaluate_param_shard_task.outputs["Output"]),
     )
 
     # Step 5: Train the model
     train_model_task = train_model(
         train_x=split_data_task.outputs["x_train_df"],
         train_y=split_data_task.outputs["y_train_df"],
-        hparams=tune_hyperparams_task.output,
+        hparams=select_best_params_task.outputs["Output"],
         fitted_scaler=fit_scaler_task.outputs["fitted_scaler"],
         seed=seed,
+        trainer=trainer,
     )
 
     # Step 6: Evaluate the model
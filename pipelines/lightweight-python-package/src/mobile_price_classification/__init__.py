@@ -1,17 +1,29 @@
 from .read_data import read_data
 from .split_data import split_data
 from .fit_scaler import fit_scaler
-from .tune_hyperparams import tune_hyperparams
+from .tune_hyperparams import (
+    tune_hyperparams,
+    shard_param_grid,
+    evaluate_param_shard,
+    select_best_params,
+)
 from .train_model import train_model
+from .train_model_out_of_core import train_model_out_of_core
 from .evaluate_model import evaluate_model
 from .test_model import test_model
+from .predict import predict_in_chunks
 
 __all__ = [
     "read_data",
     "split_data",
     "fit_scaler",
     "tune_hyperparams",
+    "shard_param_grid",
+    "evaluate_param_shard",
+    "select_best_params",
     "train_model",
+    "train_model_out_of_core",
     "evaluate_model",
     "test_model",
+    "predict_in_chunks",
 ]
@@ -1,7 +1,11 @@
+from typing import Optional
+
+import numpy as np
 import pandas as pd
-from joblib import load
 from sklearn.metrics import confusion_matrix, classification_report
 
+from .predict import DEFAULT_CHUNK_SIZE, predict_in_chunks
+
 
 def evaluate_model(
     val_x_path: str,
@@ -9,18 +13,30 @@ def evaluate_model(
     fitted_scaler_path: str,
     trained_model_path: str,
     classification_report_output_path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    n_jobs: int = -1,
+    predictions_output_path: Optional[str] = None,
 ) -> list:
     """
     Evaluates the trained SVM model using validation data.
+    Predictions are made in chunks of `chunk_size` rows across `n_jobs` processes.
     Returns confusion matrix data and writes classification report to markdown.
     """
-    scaler = load(fitted_scaler_path)
-    x_val = pd.read_parquet(val_x_path)
     y_val = pd.read_parquet(val_y_path)
-    x_val = pd.DataFrame(scaler.transform(x_val), columns=x_val.columns)
 
-    svm_model = load(trained_model_path)
-    predictions = svm_model.predict(x_val)
+    predictions = np.concatenate(
+        [
+            chunk_predictions
+            for _, chunk_predictions in predict_in_chunks(
+                x_path=val_x_path,
+                fitted_scaler_path=fitted_scaler_path,
+                trained_model_path=trained_model_path,
+                chunk_size=chunk_size,
+                n_jobs=n_jobs,
+                predictions_output_path=predictions_output_path,
+            )
+        ]
+    )
 
     # Prepare confusion matrix data
     labels = [str(v) for v in sorted(y_val["price_range"].unique())]
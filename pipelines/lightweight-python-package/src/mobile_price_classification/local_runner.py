@@ -0,0 +1,235 @@
+"""
+Runs the steps of `mobile_price_classification_pipeline` locally, without a cluster.
+
+The package functions are executed in the same dependency order as in `pipeline.py`.
+Steps whose dependencies are done run concurrently in a process pool, artifacts are
+written to a (temporary) directory and the resource usage of every step is printed.
+
+Usage:
+    python -m mobile_price_classification.local_runner --train-data train.csv --test-data test.csv
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from .read_data import read_data
+from .split_data import split_data
+from .fit_scaler import fit_scaler
+from .tune_hyperparams import tune_hyperparams
+from .train_model import train_model
+from .train_model_out_of_core import train_model_out_of_core
+from .evaluate_model import evaluate_model
+from .test_model import test_model
+from .profiling import profile_step
+
+
+class Step(NamedTuple):
+    name: str
+    func: Callable
+    dependencies: List[str]
+    # builds the keyword arguments of `func` from the return values of the finished steps
+    make_kwargs: Callable[[Dict], Dict]
+
+
+def build_steps(
+    train_data_path: str,
+    test_data_path: str,
+    artifacts_dir: str,
+    test_size: float = 0.5,
+    scatter_plot_column_x: str = "ram",
+    scatter_plot_column_y: str = "battery_power",
+    seed: int = 42,
+    trainer: str = "svc",
+    max_tuning_rows: int = 20000,
+) -> List[Step]:
+    """
+    Returns the steps of the pipeline with artifact paths inside `artifacts_dir`.
+    `trainer` and `max_tuning_rows` (0 tunes on all rows) work like the pipeline parameters.
+    """
+
+    def artifact(name: str) -> str:
+        return os.path.join(artifacts_dir, name)
+
+    if trainer == "svc":
+        train_func, train_kwargs = train_model, {}
+    else:
+        train_func, train_kwargs = train_model_out_of_core, {"feature_map": trainer}
+
+    return [
+        Step(
+            "read_data",
+            read_data,
+            [],
+            lambda _: dict(
+                minio_train_data_path=train_data_path,
+                minio_test_data_path=test_data_path,
+                train_output_path=artifact("train_df.parquet"),
+                test_output_path=artifact("test_df.parquet"),
+            ),
+        ),
+        Step(
+            "split_data",
+            split_data,
+            ["read_data"],
+            lambda _: dict(
+                train_df_path=artifact("train_df.parquet"),
+                x_train_output_path=artifact("x_train_df.parquet"),
+                y_train_output_path=artifact("y_train_df.parquet"),
+                x_val_output_path=artifact("x_val_df.parquet"),
+                y_val_output_path=artifact("y_val_df.parquet"),
+                test_size=test_size,
+                seed=seed,
+            ),
+        ),
+        Step(
+            "fit_scaler",
+            fit_scaler,
+            ["split_data"],
+            lambda _: dict(
+                train_x_path=artifact("x_train_df.parquet"),
+                fitted_scaler_output_path=artifact("fitted_scaler.joblib"),
+            ),
+        ),
+        Step(
+            "tune_hyperparams",
+            tune_hyperparams,
+            ["fit_scaler"],
+            lambda _: dict(
+                train_x_path=artifact("x_train_df.parquet"),
+                train_y_path=artifact("y_train_df.parquet"),
+                fitted_scaler_path=artifact("fitted_scaler.joblib"),
+                seed=seed,
+                max_tuning_rows=max_tuning_rows or None,
+            ),
+        ),
+        Step(
+            "train_model",
+            train_func,
+            ["tune_hyperparams"],
+            lambda results: dict(
+                train_x_path=artifact("x_train_df.parquet"),
+                train_y_path=artifact("y_train_df.parquet"),
+                fitted_scaler_path=artifact("fitted_scaler.joblib"),
+                hparams=results["tune_hyperparams"],
+                trained_model_output_path=artifact("trained_model.joblib"),
+                seed=seed,
+                **train_kwargs,
+            ),
+        ),
+        Step(
+            "evaluate_model",
+            evaluate_model,
+            ["train_model"],
+            lambda _: dict(
+                val_x_path=artifact("x_val_df.parquet"),
+                val_y_path=artifact("y_val_df.parquet"),
+                fitted_scaler_path=artifact("fitted_scaler.joblib"),
+                trained_model_path=artifact("trained_model.joblib"),
+                classification_report_output_path=artifact("classification_report.md"),
+            ),
+        ),
+        Step(
+            "test_model",
+            test_model,
+            ["train_model"],
+            lambda _: dict(
+                test_x_path=artifact("test_df.parquet"),
+                trained_model_path=artifact("trained_model.joblib"),
+                fitted_scaler_path=artifact("fitted_scaler.joblib"),
+                column_x=scatter_plot_column_x,
+                column_y=scatter_plot_column_y,
+                scatter_plot_output_path=artifact("scatter_plot.html"),
+                predictions_output_path=artifact("predictions.parquet"),
+            ),
+        ),
+    ]
+
+
+def run_steps(steps: List[Step], max_workers: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Runs the steps in dependency order, executing independent steps concurrently.
+    Returns the figures measured by `profile_step` for every step. As the worker processes
+    are reused, peak RSS is the peak of the worker up to and including the step.
+    """
+    results: Dict[str, object] = {}
+    stats: Dict[str, Dict[str, float]] = {}
+    pending = list(steps)
+    running = {}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for step in [s for s in pending if all(d in results for d in s.dependencies)]:
+                pending.remove(step)
+                print(f"[local-runner] starting {step.name}")
+                future = pool.submit(profile_step, step.func, **step.make_kwargs(results))
+                running[future] = step
+
+            if not running:
+                missing = {d for s in pending for d in s.dependencies} - {s.name for s in steps}
+                raise ValueError(f"Unknown step dependencies: {sorted(missing)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                results[step.name], stats[step.name] = future.result()
+                print(f"[local-runner] finished {step.name} in {stats[step.name]['wall_time_seconds']:.2f}s")
+
+    return stats
+
+
+def run_pipeline_locally(
+    train_data_path: str,
+    test_data_path: str,
+    artifacts_dir: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    **pipeline_args,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Runs the whole pipeline locally and prints the resource usage of each step.
+    Artifacts go to `artifacts_dir` or, if not given, to a new temporary directory.
+    """
+    if artifacts_dir is None:
+        artifacts_dir = tempfile.mkdtemp(prefix="mobile-price-classification-")
+    os.makedirs(artifacts_dir, exist_ok=True)
+    print(f"[local-runner] writing artifacts to {artifacts_dir}")
+
+    steps = build_steps(train_data_path, test_data_path, artifacts_dir, **pipeline_args)
+
+    start = time.perf_counter()
+    stats = run_steps(steps, max_workers=max_workers)
+    total = time.perf_counter() - start
+
+    columns = list(stats[steps[0].name])
+    print("\n" + f"{'step':<20}" + "".join(f"{c:>20}" for c in columns))
+    for step in steps:
+        print(f"{step.name:<20}" + "".join(f"{stats[step.name][c]:>20.2f}" for c in columns))
+    print(f"{'total (wall)':<20}{total:>20.2f}")
+
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train-data", required=True, help="Path to the training CSV file.")
+    parser.add_argument("--test-data", required=True, help="Path to the test CSV file.")
+    parser.add_argument("--artifacts-dir", default=None, help="Defaults to a new temporary directory.")
+    parser.add_argument("--max-workers", type=int, default=None, help="Size of the process pool.")
+    parser.add_argument("--test-size", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--trainer", choices=["svc", "rbf_sampler", "nystroem"], default="svc")
+    parser.add_argument("--max-tuning-rows", type=int, default=20000, help="Rows used for tuning, 0 for all.")
+    args = parser.parse_args()
+
+    run_pipeline_locally(
+        train_data_path=args.train_data,
+        test_data_path=args.test_data,
+        artifacts_dir=args.artifacts_dir,
+        max_workers=args.max_workers,
+        test_size=args.test_size,
+        seed=args.seed,
+        trainer=args.trainer,
+        max_tuning_rows=args.max_tuning_rows,
+    )
@@ -0,0 +1,139 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from joblib import load
+
+
+DEFAULT_CHUNK_SIZE = 10_000
+
+# model loaded once per worker process by `_init_worker`
+_worker_model = None
+
+
+def _init_worker(trained_model_path: str):
+    global _worker_model
+    _worker_model = load(trained_model_path)
+
+
+def _predict_chunk(x_chunk: pd.DataFrame) -> np.ndarray:
+    return _worker_model.predict(x_chunk)
+
+
+def _cgroup_cpu_quota() -> Optional[float]:
+    """Returns the CPU limit of the container (e.g. of a KFP pod), or None if there is none."""
+    try:
+        # cgroup v2, "max 100000" without a limit
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()
+        return None if limit == "max" else int(limit) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1, a quota of -1 means no limit
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            limit = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return limit / period if limit > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def _available_cpus() -> int:
+    """
+    Returns the number of CPUs the process may run on, capped by the CPU limit of its
+    container. Without the cap, a pod limited to 2 CPUs on a 64-core node would count 64.
+    """
+    available = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        available = min(available, max(1, int(quota)))
+    return available
+
+
+def _resolve_n_jobs(n_jobs: int) -> int:
+    if n_jobs > 0:
+        return n_jobs
+    return max(1, _available_cpus() + 1 + n_jobs)
+
+
+def _scaled_chunks(
+    x_path: str, fitted_scaler_path: str, chunk_size: int, drop_columns: List[str]
+) -> Iterator[pd.DataFrame]:
+    """Reads the parquet file row group by row group in chunks and scales each chunk."""
+    scaler = load(fitted_scaler_path)
+    parquet_file = pq.ParquetFile(x_path)
+    columns = [
+        name
+        for name in parquet_file.schema_arrow.names
+        if name not in drop_columns and not name.startswith("__index_level_")
+    ]
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+        x_chunk = batch.to_pandas()
+        yield pd.DataFrame(scaler.transform(x_chunk), columns=x_chunk.columns)
+
+
+def predict_in_chunks(
+    x_path: str,
+    fitted_scaler_path: str,
+    trained_model_path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    n_jobs: int = -1,
+    drop_columns: Optional[List[str]] = None,
+    predictions_output_path: Optional[str] = None,
+) -> Iterator[Tuple[pd.DataFrame, np.ndarray]]:
+    """
+    Scales the features in `x_path` and predicts them with the trained model chunk by chunk.
+    Predictions run in a pool of `n_jobs` processes (negative values count back from the number
+    of available cores, like in scikit-learn) that load the model once. Only a bounded number of
+    chunks is in flight at a time, so memory stays flat regardless of the size of the input.
+
+    Yields the scaled features and the predictions of every chunk in input order. If
+    `predictions_output_path` is given, the predictions are also streamed to a parquet file.
+    """
+    chunks = _scaled_chunks(x_path, fitted_scaler_path, chunk_size, drop_columns or [])
+    n_jobs = _resolve_n_jobs(n_jobs)
+
+    writer = None
+    try:
+        for x_chunk, predictions in _predict_chunks(chunks, trained_model_path, n_jobs):
+            if predictions_output_path is not None:
+                table = pa.table({"prediction": predictions})
+                if writer is None:
+                    writer = pq.ParquetWriter(predictions_output_path, table.schema)
+                writer.write_table(table)
+            yield x_chunk, predictions
+        if predictions_output_path is not None and writer is None:
+            pq.write_table(pa.table({"prediction": pa.array([], pa.int64())}), predictions_output_path)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _predict_chunks(
+    chunks: Iterator[pd.DataFrame], trained_model_path: str, n_jobs: int
+) -> Iterator[Tuple[pd.DataFrame, np.ndarray]]:
+    if n_jobs == 1:
+        model = load(trained_model_path)
+        for x_chunk in chunks:
+            yield x_chunk, model.predict(x_chunk)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=n_jobs, initializer=_init_worker, initargs=(trained_model_path,)
+    ) as pool:
+        in_flight = deque()
+        for x_chunk in chunks:
+            in_flight.append((x_chunk, pool.submit(_predict_chunk, x_chunk)))
+            if len(in_flight) >= 2 * n_jobs:
+                x_done, future = in_flight.popleft()
+                yield x_done, future.result()
+        while in_flight:
+            x_done, future = in_flight.popleft()
+            yield x_done, future.result()
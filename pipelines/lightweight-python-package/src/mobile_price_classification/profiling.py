@@ -0,0 +1,94 @@
+import os
+import resource
+import sys
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+def _path_arguments(kwargs: Dict) -> Tuple[list, list]:
+    """
+    Splits the path arguments of a package function into inputs and outputs,
+    following the naming convention `<name>_path` and `<name>_output_path`.
+    """
+    inputs, outputs = [], []
+    for name, value in kwargs.items():
+        if not isinstance(value, str) or not name.endswith("_path"):
+            continue
+        (outputs if name.endswith("_output_path") else inputs).append(value)
+    return inputs, outputs
+
+
+def _local_files(paths: Iterable[str]) -> list:
+    return [path for path in paths if "://" not in path and os.path.isfile(path)]
+
+
+def _num_rows(paths: Iterable[str]) -> int:
+    """Returns the largest row count of the parquet files among `paths`, 0 if there are none."""
+    rows = 0
+    for path in _local_files(paths):
+        try:
+            rows = max(rows, pq.read_metadata(path).num_rows)
+        except (pa.ArrowInvalid, OSError):
+            pass  # not a parquet file
+    return rows
+
+
+def _peak_rss_mb() -> float:
+    usage = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return usage / 1024**2 if sys.platform == "darwin" else usage / 1024
+
+
+def _cpu_seconds() -> float:
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (
+        self_usage.ru_utime + self_usage.ru_stime + children_usage.ru_utime + children_usage.ru_stime
+    )
+
+
+def profile_step(
+    func: Callable,
+    log_metric: Optional[Callable[[str, float], None]] = None,
+    **kwargs,
+) -> Tuple[object, Dict[str, float]]:
+    """
+    Calls `func(**kwargs)` and measures the resources it used:
+    wall time, CPU time (including child processes), peak RSS, rows processed per second
+    and bytes read and written. Bytes and rows are derived from the path arguments, where
+    arguments ending in `_output_path` count as written and other `_path` arguments as read.
+    Peak RSS is the peak of the whole process, which is the step itself in a KFP pod.
+
+    If `log_metric` is given (e.g. `metrics.log_metric` of a KFP `Metrics` artifact), every
+    figure is also logged with it. Returns the result of `func` and the figures.
+    """
+    input_paths, output_paths = _path_arguments(kwargs)
+
+    cpu_start = _cpu_seconds()
+    wall_start = time.perf_counter()
+    result = func(**kwargs)
+    wall_time = time.perf_counter() - wall_start
+    cpu_time = _cpu_seconds() - cpu_start
+
+    rows = _num_rows(input_paths) or _num_rows(output_paths)
+    stats = {
+        "wall_time_seconds": wall_time,
+        "cpu_time_seconds": cpu_time,
+        "peak_rss_mb": _peak_rss_mb(),
+        "rows_per_second": rows / wall_time if wall_time > 0 else 0.0,
+        "bytes_read": float(sum(os.path.getsize(p) for p in _local_files(input_paths))),
+        "bytes_written": float(sum(os.path.getsize(p) for p in _local_files(output_paths))),
+    }
+
+    print(f"Profile of {func.__name__}: " + ", ".join(f"{k}={v:.2f}" for k, v in stats.items()))
+    if log_metric is not None:
+        for name, value in stats.items():
+            log_metric(name, value)
+
+    return result, stats
@@ -8,15 +8,23 @@ def read_data(
     train_output_path: str,
     test_output_path: str,
 ):
-    """Reads training and test data from MinIO and writes to parquet files."""
+    """
+    Reads training and test data from MinIO and writes to parquet files.
+    Paths that don't start with s3:// are read from the local file system.
+    """
     storage_options = {
         "key": os.environ.get("AWS_ACCESS_KEY_ID"),
         "secret": os.environ.get("AWS_SECRET_ACCESS_KEY"),
         "client_kwargs": {"endpoint_url": "http://minio.minio"},
     }
 
-    df_train = pd.read_csv(minio_train_data_path, storage_options=storage_options)
-    df_test = pd.read_csv(minio_test_data_path, storage_options=storage_options)
+    def _read_csv(path: str) -> pd.DataFrame:
+        if path.startswith("s3://"):
+            return pd.read_csv(path, storage_options=storage_options)
+        return pd.read_csv(path)
+
+    df_train = _read_csv(minio_train_data_path)
+    df_test = _read_csv(minio_test_data_path)
 
     df_train.to_parquet(train_output_path)
     df_test.to_parquet(test_output_path)
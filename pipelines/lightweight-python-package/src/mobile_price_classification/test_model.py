@@ -1,6 +1,45 @@
+from typing import Optional
+
+import numpy as np
 import pandas as pd
-from joblib import load
 import plotly.express as px
+import plotly.graph_objects as go
+
+from .predict import DEFAULT_CHUNK_SIZE, predict_in_chunks
+
+
+# Resolution of the server-side density aggregate. Features are MinMax scaled, so
+# the aggregate covers [0, 1] in both dimensions and clips values outside of it.
+DENSITY_BINS = 200
+
+
+def _update_sample(
+    sample: Optional[pd.DataFrame], chunk: pd.DataFrame, max_points_per_class: int
+) -> pd.DataFrame:
+    """
+    Keeps a uniform random sample of at most `max_points_per_class` rows per predicted class.
+    Every row gets a random key and the rows with the smallest keys are kept (bottom-k
+    sampling), so the sample can be updated chunk by chunk with bounded memory.
+    """
+    merged = chunk if sample is None else pd.concat([sample, chunk])
+    if max_points_per_class <= 0:
+        return merged
+    return merged.sort_values("_key").groupby("Predicted Class").head(max_points_per_class)
+
+
+def _density_trace(counts: np.ndarray) -> go.Heatmap:
+    centers = (np.arange(DENSITY_BINS) + 0.5) / DENSITY_BINS
+    return go.Heatmap(
+        x=centers,
+        y=centers,
+        # histogram2d bins x along the first axis, Heatmap expects rows along y
+        z=np.log1p(counts.T),
+        colorscale="Greys",
+        reversescale=True,
+        showscale=False,
+        hoverinfo="skip",
+        name="density",
+    )
 
 
 def test_model(
@@ -10,19 +49,64 @@ def test_model(
     column_x: str,
     column_y: str,
     scatter_plot_output_path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    n_jobs: int = -1,
+    predictions_output_path: Optional[str] = None,
+    render_mode: str = "webgl",
+    max_points_per_class: int = 20_000,
+    density_threshold: int = 0,
+    seed: int = 42,
 ):
     """
     Test a trained SVM model on test data and produce a scatter plot.
+    Predictions are made in chunks of `chunk_size` rows across `n_jobs` processes
+    and optionally streamed to a parquet file.
+
+    To keep the plot small for large test sets, at most `max_points_per_class` points
+    per predicted class are drawn (0 draws all points) using plotly's `render_mode`
+    ("webgl" uses `scattergl`). If `density_threshold` is positive and the test set has
+    more rows than that, a density aggregate of all rows is rendered underneath the points.
+    An empty test set produces a plot without points.
     """
-    scaler = load(fitted_scaler_path)
-    x_test = pd.read_parquet(test_x_path)
-    x_test = x_test.drop("id", axis=1)
-    x_test = pd.DataFrame(scaler.transform(x_test), columns=x_test.columns)
+    rng = np.random.default_rng(seed)
+    sample = None
+    counts = np.zeros((DENSITY_BINS, DENSITY_BINS))
+    n_rows = 0
+
+    for x_chunk, predictions in predict_in_chunks(
+        x_path=test_x_path,
+        fitted_scaler_path=fitted_scaler_path,
+        trained_model_path=trained_model_path,
+        chunk_size=chunk_size,
+        n_jobs=n_jobs,
+        drop_columns=["id"],
+        predictions_output_path=predictions_output_path,
+    ):
+        # only keep what is needed for the plot
+        plot_chunk = x_chunk[[column_x, column_y]].copy()
+        plot_chunk["Predicted Class"] = predictions
+        plot_chunk["_row"] = np.arange(n_rows, n_rows + len(plot_chunk))
+        plot_chunk["_key"] = rng.random(len(plot_chunk))
+        sample = _update_sample(sample, plot_chunk, max_points_per_class)
+        n_rows += len(plot_chunk)
 
-    svm_model = load(trained_model_path)
-    predictions = svm_model.predict(x_test)
+        if density_threshold > 0:
+            counts += np.histogram2d(
+                np.clip(plot_chunk[column_x], 0, 1),
+                np.clip(plot_chunk[column_y], 0, 1),
+                bins=DENSITY_BINS,
+                range=[[0, 1], [0, 1]],
+            )[0]
 
-    x_test["Predicted Class"] = predictions
+    title = f"Scatter plot of {column_x} vs. {column_y} colored by Predicted Class"
+    if sample is None:
+        print("The test set is empty, writing an empty scatter plot.")
+        x_test = pd.DataFrame(columns=[column_x, column_y, "Predicted Class"])
+        title += " (test set is empty)"
+    else:
+        x_test = sample.sort_values("_row").drop(columns=["_row", "_key"])
+        if len(x_test) < n_rows:
+            title += f" ({len(x_test)} of {n_rows} points shown)"
 
     fig = px.scatter(
         x_test,
@@ -30,8 +114,14 @@ def test_model(
         y=column_y,
         color="Predicted Class",
         color_continuous_scale="Viridis",
-        title=f"Scatter plot of {column_x} vs. {column_y} colored by Predicted Class",
+        title=title,
         template="plotly_dark",
+        render_mode=render_mode,
     )
 
+    if 0 < density_threshold < n_rows:
+        fig.add_trace(_density_trace(counts))
+        # draw the density underneath the points
+        fig.data = fig.data[-1:] + fig.data[:-1]
+
     fig.write_html(scatter_plot_output_path)
@@ -0,0 +1,96 @@
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from joblib import dump, load
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer
+
+from .tune_hyperparams import _resolve_gamma
+
+
+FEATURE_MAPS = {"nystroem": Nystroem, "rbf_sampler": RBFSampler}
+
+
+def _row_group_chunks(
+    train_x_path: str, train_y_path: str, chunk_size: int
+) -> Iterator[Tuple[pd.DataFrame, np.ndarray]]:
+    """Yields aligned (x, y) chunks of at most `chunk_size` rows, reading one row group at a time."""
+    x_file, y_file = pq.ParquetFile(train_x_path), pq.ParquetFile(train_y_path)
+    x_columns = [name for name in x_file.schema_arrow.names if not name.startswith("__index_level_")]
+    if [x_file.metadata.row_group(i).num_rows for i in range(x_file.num_row_groups)] != [
+        y_file.metadata.row_group(i).num_rows for i in range(y_file.num_row_groups)
+    ]:
+        raise ValueError("The row groups of the training features and labels are not aligned.")
+
+    for i in range(x_file.num_row_groups):
+        x_group = x_file.read_row_group(i, columns=x_columns).to_pandas()
+        y_group = y_file.read_row_group(i, columns=["price_range"]).column("price_range").to_numpy()
+        for start in range(0, len(x_group), chunk_size):
+            yield x_group.iloc[start : start + chunk_size], y_group[start : start + chunk_size]
+
+
+def _fit_feature_map(feature_map: str, hparams: Dict, x_chunk: pd.DataFrame, n_components: int, seed: int):
+    if hparams.get("kernel", "rbf") == "linear":
+        return FunctionTransformer().fit(x_chunk)
+    if feature_map == "nystroem":
+        # Nystroem samples its components from the data it is fitted on
+        n_components = min(n_components, len(x_chunk))
+    return FEATURE_MAPS[feature_map](
+        gamma=_resolve_gamma(hparams.get("gamma", "scale"), x_chunk.values),
+        n_components=n_components,
+        random_state=seed,
+    ).fit(x_chunk)
+
+
+def train_model_out_of_core(
+    train_x_path: str,
+    train_y_path: str,
+    fitted_scaler_path: str,
+    hparams: Dict,
+    trained_model_output_path: str,
+    feature_map: str = "rbf_sampler",
+    n_components: int = 1000,
+    epochs: int = 5,
+    chunk_size: int = 100_000,
+    seed: int = 42,
+):
+    """
+    Trains an approximate kernel SVM for datasets that don't fit into memory.
+    Instead of an exact SVC, a random feature map (`rbf_sampler` or `nystroem`) approximating
+    the RBF kernel is combined with a linear SVM trained with `SGDClassifier.partial_fit`,
+    streamed over the parquet row groups in chunks of `chunk_size` rows for `epochs` passes.
+    `gamma` and `C` are taken from the tuned hyperparameters, with C translated into the
+    regularization strength `alpha = 1 / (C * n_samples)`. For a linear kernel the features
+    are used as they are. `gamma="scale"` is estimated on the first chunk.
+
+    The feature map (fitted on the first chunk) and the classifier are saved as one scikit-learn
+    `Pipeline`, so the artifact can be used exactly like the one of `train_model`.
+    """
+    if feature_map not in FEATURE_MAPS:
+        raise ValueError(f"Unknown feature map '{feature_map}', expected one of {list(FEATURE_MAPS)}")
+
+    scaler = load(fitted_scaler_path)
+    n_samples = pq.read_metadata(train_x_path).num_rows
+    classes = np.unique(pq.read_table(train_y_path, columns=["price_range"]).column("price_range").to_numpy())
+
+    classifier = SGDClassifier(loss="hinge", alpha=1.0 / (hparams.get("C", 1.0) * n_samples), random_state=seed)
+    transformer = None
+    rng = np.random.default_rng(seed)
+
+    for epoch in range(epochs):
+        for x_chunk, y_chunk in _row_group_chunks(train_x_path, train_y_path, chunk_size):
+            order = rng.permutation(len(y_chunk))
+            x_chunk = pd.DataFrame(scaler.transform(x_chunk), columns=x_chunk.columns).iloc[order]
+            y_chunk = y_chunk[order]
+
+            if transformer is None:
+                transformer = _fit_feature_map(feature_map, hparams, x_chunk, n_components, seed)
+
+            classifier.partial_fit(transformer.transform(x_chunk), y_chunk, classes=classes)
+        print(f"Finished epoch {epoch + 1}/{epochs}")
+
+    dump(Pipeline([("feature_map", transformer), ("classifier", classifier)]), trained_model_output_path)
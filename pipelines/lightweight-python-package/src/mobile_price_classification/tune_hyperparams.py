@@ -1,11 +1,206 @@
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import GridSearchCV
+from sklearn.metrics import accuracy_score
+from sklearn.metrics.pairwise import pairwise_kernels
+from sklearn.model_selection import ParameterGrid, StratifiedKFold, train_test_split
 from sklearn.svm import SVC
 from joblib import load
 
 
+CV_FOLDS = 5
+
+# Kernel matrices are only precomputed if a fold's training kernel stays below
+# this size (in bytes), otherwise libsvm computes the kernel values on the fly.
+KERNEL_CACHE_MAX_BYTES = 512 * 1024**2
+
+
+def _param_grid(C: List, kernel: List, gamma: List, decision_function_shape: List[str]) -> List[Dict]:
+    """Returns the candidates in the same order GridSearchCV would evaluate them."""
+    return list(
+        ParameterGrid(
+            dict(
+                kernel=kernel,
+                C=C,
+                gamma=gamma,
+                decision_function_shape=decision_function_shape,
+            )
+        )
+    )
+
+
+def _effective_params(params: Dict) -> Tuple:
+    """
+    Returns a hashable key of the parameters that actually influence the fitted model.
+    `decision_function_shape` only changes the output of `decision_function`, not the
+    predictions, and `gamma` is ignored by the linear kernel.
+    """
+    effective = {k: v for k, v in params.items() if k != "decision_function_shape"}
+    if effective["kernel"] == "linear":
+        effective.pop("gamma", None)
+    return tuple(sorted(effective.items()))
+
+
+def _resolve_gamma(gamma, x: np.ndarray) -> float:
+    """Resolves 'auto' and 'scale' the same way SVC does for dense input."""
+    if gamma == "auto":
+        return 1.0 / x.shape[1]
+    if gamma == "scale":
+        x_var = x.var()
+        return 1.0 / (x.shape[1] * x_var) if x_var != 0 else 1.0
+    return gamma
+
+
+def _score_fold(
+    x: np.ndarray,
+    y: np.ndarray,
+    train_idx: np.ndarray,
+    test_idx: np.ndarray,
+    kernel: str,
+    gamma,
+    C_values: List,
+    seed: int,
+) -> List[float]:
+    """
+    Fits one SVC per value of C on a single CV fold and returns the accuracy of each.
+    If the kernel matrix is small enough it is computed once and shared by all values of C.
+    """
+    x_train, x_test = x[train_idx], x[test_idx]
+    y_train, y_test = y[train_idx], y[test_idx]
+
+    precompute = len(C_values) > 1 and len(train_idx) ** 2 * 8 <= KERNEL_CACHE_MAX_BYTES
+    if precompute:
+        kernel_kwargs = {} if kernel == "linear" else {"gamma": _resolve_gamma(gamma, x_train)}
+        if kernel in ("poly", "sigmoid"):
+            kernel_kwargs["coef0"] = 0.0
+        if kernel == "poly":
+            kernel_kwargs["degree"] = 3
+        k_train = pairwise_kernels(x_train, metric=kernel, **kernel_kwargs)
+        k_test = pairwise_kernels(x_test, x_train, metric=kernel, **kernel_kwargs)
+
+    scores = []
+    for C in C_values:
+        if precompute:
+            svm = SVC(C=C, kernel="precomputed", random_state=seed)
+            svm.fit(k_train, y_train)
+            predictions = svm.predict(k_test)
+        else:
+            # gamma is None for the linear kernel, which ignores it
+            svm = SVC(C=C, kernel=kernel, gamma="scale" if gamma is None else gamma, random_state=seed)
+            svm.fit(x_train, y_train)
+            predictions = svm.predict(x_test)
+        scores.append(accuracy_score(y_test, predictions))
+    return scores
+
+
+def _score_candidates(
+    x: np.ndarray,
+    y: np.ndarray,
+    candidates: List[Dict],
+    seed: int,
+    dask_scheduler_address: Optional[str] = None,
+) -> List[float]:
+    """
+    Returns the mean cross-validation accuracy of every candidate. Candidates that
+    produce identical models are only fitted once and fits that share a kernel are
+    grouped so that each kernel matrix is computed once per fold.
+    If `dask_scheduler_address` is set, the (kernel, gamma, fold) units are evaluated
+    on that Dask cluster instead of in the current process.
+    """
+    distinct = {}
+    for params in candidates:
+        distinct.setdefault(_effective_params(params), params)
+
+    # group the distinct configurations by (kernel, gamma), so that they only differ in C
+    groups: Dict[Tuple, List] = {}
+    for key, params in distinct.items():
+        group_key = (params["kernel"], dict(key).get("gamma"))
+        groups.setdefault(group_key, []).append((key, params["C"]))
+
+    folds = list(StratifiedKFold(n_splits=CV_FOLDS).split(x, y))
+    units = [
+        (members, kernel, gamma, train_idx, test_idx)
+        for (kernel, gamma), members in groups.items()
+        for train_idx, test_idx in folds
+    ]
+
+    if dask_scheduler_address is None:
+        unit_scores = [
+            _score_fold(x, y, train_idx, test_idx, kernel, gamma, [C for _, C in members], seed)
+            for members, kernel, gamma, train_idx, test_idx in units
+        ]
+    else:
+        unit_scores = _score_units_on_dask(x, y, units, seed, dask_scheduler_address)
+
+    fold_scores = {key: [] for key in distinct}
+    for (members, *_), scores in zip(units, unit_scores):
+        for (key, _), score in zip(members, scores):
+            fold_scores[key].append(score)
+
+    print(f"Fitted {len(distinct)} distinct of {len(candidates)} candidate configurations.")
+    return [float(np.mean(fold_scores[_effective_params(params)])) for params in candidates]
+
+
+def _score_units_on_dask(
+    x: np.ndarray,
+    y: np.ndarray,
+    units: List[Tuple],
+    seed: int,
+    dask_scheduler_address: str,
+) -> List[List[float]]:
+    """
+    Evaluates the units with `_score_fold` on a Dask cluster. The training matrices are
+    scattered to all workers once, so that each task only ships the fold indices.
+    Works with any scheduler address, e.g. the one of a `LocalCluster` or a `KubeCluster`.
+    The workers need this package installed, e.g. by running them with the components image.
+    """
+    # dask is an optional dependency, only needed for this backend
+    from dask.distributed import Client
+
+    with Client(dask_scheduler_address) as client:
+        x_future, y_future = client.scatter([x, y], broadcast=True)
+        futures = [
+            client.submit(
+                _score_fold,
+                x_future,
+                y_future,
+                train_idx,
+                test_idx,
+                kernel,
+                gamma,
+                [C for _, C in members],
+                seed,
+                pure=False,
+            )
+            for members, kernel, gamma, train_idx, test_idx in units
+        ]
+        return client.gather(futures)
+
+
+def _load_scaled_training_data(
+    train_x_path: str,
+    train_y_path: str,
+    fitted_scaler_path: str,
+    max_rows: Optional[int] = None,
+    seed: int = 42,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Loads and scales the training data. If there are more than `max_rows` rows, a stratified
+    subsample of `max_rows` rows is returned, as SVC fits scale quadratically with the rows.
+    """
+    scaler = load(fitted_scaler_path)
+
+    x_train = pd.read_parquet(train_x_path)
+    y_train = pd.read_parquet(train_y_path)["price_range"].values
+    if max_rows is not None and len(x_train) > max_rows:
+        x_train, _, y_train, _ = train_test_split(
+            x_train, y_train, train_size=max_rows, stratify=y_train, random_state=seed
+        )
+        print(f"Tuning on a stratified subsample of {max_rows} rows.")
+    return scaler.transform(x_train), y_train
+
+
 def tune_hyperparams(
     train_x_path: str,
     train_y_path: str,
@@ -15,9 +210,13 @@ def tune_hyperparams(
     gamma: List = None,
     decision_function_shape: List[str] = None,
     seed: int = 42,
+    dask_scheduler_address: Optional[str] = None,
+    max_tuning_rows: Optional[int] = None,
 ) -> dict:
     """
-    Performs hyperparameter tuning using GridSearchCV for an SVM classifier.
+    Performs a cross-validated grid search for an SVM classifier, equivalent to GridSearchCV.
+    If `dask_scheduler_address` is given, the search runs on that Dask cluster.
+    If `max_tuning_rows` is given, the search runs on a stratified subsample of at most that many rows.
     Returns the best hyperparameters found.
     """
     if C is None:
@@ -29,27 +228,101 @@ def tune_hyperparams(
     if decision_function_shape is None:
         decision_function_shape = ["ovo", "ovr"]
 
-    scaler = load(fitted_scaler_path)
+    x_train, y_train = _load_scaled_training_data(
+        train_x_path, train_y_path, fitted_scaler_path, max_tuning_rows, seed
+    )
 
-    x_train = pd.read_parquet(train_x_path)
-    y_train = pd.read_parquet(train_y_path)
-    x_train = pd.DataFrame(scaler.transform(x_train), columns=x_train.columns)
-
-    svm = SVC(random_state=seed)
-
-    grid_svm = GridSearchCV(
-        estimator=svm,
-        cv=5,
-        param_grid=dict(
-            kernel=kernel,
-            C=C,
-            gamma=gamma,
-            decision_function_shape=decision_function_shape,
-        ),
+    candidates = _param_grid(C, kernel, gamma, decision_function_shape)
+    mean_scores = _score_candidates(x_train, y_train, candidates, seed, dask_scheduler_address)
+
+    # like GridSearchCV, ties are resolved in favour of the first candidate in grid order
+    best_index = int(np.argmax(mean_scores))
+
+    print("Best score: ", mean_scores[best_index])
+
+    return candidates[best_index]
+
+
+def shard_param_grid(
+    C: List,
+    kernel: List,
+    gamma: List,
+    decision_function_shape: List[str],
+    num_shards: int,
+) -> List[List[Dict]]:
+    """
+    Partitions the parameter grid into at most `num_shards` shards of roughly equal cost.
+    Candidates that share a kernel matrix are kept in the same shard, so that the
+    deduplication and kernel reuse of the grid search still apply within each shard.
+    Every candidate keeps its grid index, which is used to break ties like GridSearchCV.
+    """
+    groups: Dict[Tuple, List[Dict]] = {}
+    for index, params in enumerate(_param_grid(C, kernel, gamma, decision_function_shape)):
+        group_key = (params["kernel"], dict(_effective_params(params)).get("gamma"))
+        groups.setdefault(group_key, []).append({"index": index, "params": params})
+
+    def _cost(members: List[Dict]) -> int:
+        return len({_effective_params(member["params"]) for member in members})
+
+    # greedily assign the most expensive groups to the least loaded shard
+    shards: List[List[Dict]] = [[] for _ in range(max(1, num_shards))]
+    loads = [0] * len(shards)
+    for members in sorted(groups.values(), key=_cost, reverse=True):
+        target = loads.index(min(loads))
+        shards[target].extend(members)
+        loads[target] += _cost(members)
+
+    return [shard for shard in shards if shard]
+
+
+def evaluate_param_shard(
+    train_x_path: str,
+    train_y_path: str,
+    fitted_scaler_path: str,
+    shard: List[Dict],
+    seed: int = 42,
+    max_tuning_rows: Optional[int] = None,
+) -> List[Dict]:
+    """
+    Cross-validates all candidates of a shard created by `shard_param_grid`, on a stratified
+    subsample of at most `max_tuning_rows` rows if given. All shards use the same subsample.
+    Returns one result with the grid index, the parameters and the mean score per candidate.
+    """
+    x_train, y_train = _load_scaled_training_data(
+        train_x_path, train_y_path, fitted_scaler_path, max_tuning_rows, seed
     )
 
-    grid_svm.fit(x_train, y_train["price_range"].values)
+    candidates = [member["params"] for member in shard]
+    mean_scores = _score_candidates(x_train, y_train, candidates, seed)
+
+    return [
+        {"index": member["index"], "params": member["params"], "mean_test_score": score}
+        for member, score in zip(shard, mean_scores)
+    ]
+
+
+def select_best_params(shard_results: List[List[Dict]], leaderboard_output_path: str) -> dict:
+    """
+    Merges the results of all shards, writes a leaderboard to markdown and
+    returns the best hyperparameters found.
+    """
+    results = sorted((r for shard in shard_results for r in shard), key=lambda r: r["index"])
+
+    # sorting is stable, so ties keep their grid order just like in GridSearchCV
+    leaderboard = sorted(results, key=lambda r: r["mean_test_score"], reverse=True)
+    best = leaderboard[0]
+
+    param_names = list(best["params"])
+    lines = [
+        "| Rank | Mean accuracy | " + " | ".join(param_names) + " |",
+        "|---" * (len(param_names) + 2) + "|",
+    ]
+    for rank, result in enumerate(leaderboard, start=1):
+        values = " | ".join(str(result["params"][name]) for name in param_names)
+        lines.append(f"| {rank} | {result['mean_test_score']:.4f} | {values} |")
+    with open(leaderboard_output_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
 
-    print("Best score: ", grid_svm.best_score_)
+    print("Best score: ", best["mean_test_score"])
 
-    return grid_svm.best_params_
+    return best["params"]
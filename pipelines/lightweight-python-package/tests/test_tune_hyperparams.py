@@ -0,0 +1,49 @@
+import importlib
+
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from sklearn.svm import SVC
+
+from mobile_price_classification.tune_hyperparams import CV_FOLDS, _param_grid, _score_candidates
+
+# the package exports the function of the same name, so the module is looked up explicitly
+tune_hyperparams_module = importlib.import_module("mobile_price_classification.tune_hyperparams")
+
+SEED = 42
+
+
+@pytest.fixture
+def data():
+    x, y = make_classification(
+        n_samples=200, n_features=6, n_informative=4, n_classes=4, random_state=SEED
+    )
+    return x, y
+
+
+def _grid_search_scores(x, y, grid):
+    search = GridSearchCV(SVC(random_state=SEED), grid, cv=StratifiedKFold(n_splits=CV_FOLDS))
+    search.fit(x, y)
+    return list(search.cv_results_["mean_test_score"])
+
+
+@pytest.mark.parametrize(
+    "grid",
+    [
+        # a single C, so the kernel matrix is never precomputed
+        dict(C=[1], kernel=["linear", "rbf"], gamma=["auto"], decision_function_shape=["ovo"]),
+        dict(C=[0.5, 1, 2], kernel=["linear", "rbf"], gamma=["auto", 0.1], decision_function_shape=["ovo", "ovr"]),
+    ],
+)
+@pytest.mark.parametrize("precompute", [True, False])
+def test_scores_match_grid_search(data, monkeypatch, grid, precompute):
+    if not precompute:
+        # folds above the cache limit fit SVCs on the features directly
+        monkeypatch.setattr(tune_hyperparams_module, "KERNEL_CACHE_MAX_BYTES", 0)
+    x, y = data
+    candidates = _param_grid(**grid)
+
+    scores = _score_candidates(x, y, candidates, SEED)
+
+    np.testing.assert_allclose(scores, _grid_search_scores(x, y, grid))
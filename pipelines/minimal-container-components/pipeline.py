@@ -1,8 +1,11 @@
+from typing import List
+
 from kfp import dsl
 from kfp.dsl import Input, Output, Dataset, Markdown
 
 
 COMPONENTS_IMAGE = 'alpine:3.18.2'
+PYTHON_IMAGE = 'python:3.11-alpine'
 
 
 @dsl.container_component
@@ -37,3 +40,90 @@ def container_components_pipeline(input1: str, input2: str):
     result01 = ingest_data(input_data=input2)
     merged = merge_data(dataset1=result00.output, dataset2=result01.output)
     copy_data(dataset=merged.output)
+
+
+# Variants for large artifacts, which stream the data instead of holding it in memory
+
+
+@dsl.container_component
+def ingest_data_streaming(input_data: str, size_mb: int, output: Output[Dataset]):
+    # yes repeats the input as lines, and head cuts the stream at size_mb megabytes
+    return dsl.ContainerSpec(
+        image=COMPONENTS_IMAGE,
+        command=['sh', '-c', 'yes "$0" | head -c $(( $1 * 1048576 )) > "$2"'],
+        args=[input_data, size_mb, output.path])
+
+
+@dsl.component(base_image=PYTHON_IMAGE)
+def merge_data_streaming(
+    datasets: Input[List[Dataset]],
+    output: Output[Dataset],
+    compress: bool = False,
+    buffer_size_mb: int = 8,
+):
+    """Concatenates any number of datasets through one buffer of `buffer_size_mb`, optionally gzip
+    compressed, and stores the size, sha256 checksum and throughput in the metadata of `output`."""
+    import gzip
+    import hashlib
+    import time
+
+    class HashingWriter:
+        # hashes the bytes as written to the artifact, i.e. after compression
+        def __init__(self, f):
+            self.f = f
+            self.sha256 = hashlib.sha256()
+            self.bytes_written = 0
+
+        def write(self, data):
+            # unbuffered writes can be partial (e.g. at 2 GiB on Linux, or on network volumes),
+            # so write until all bytes are out and only hash those that were written
+            view = memoryview(data).cast('B')
+            while view:
+                n = self.f.write(view)
+                self.sha256.update(view[:n])
+                self.bytes_written += n
+                view = view[n:]
+            return len(data)
+
+        def flush(self):
+            self.f.flush()
+
+    buffer = memoryview(bytearray(buffer_size_mb * 1024 * 1024))
+    bytes_read = 0
+    start = time.perf_counter()
+    with open(output.path, 'wb', buffering=0) as f:
+        writer = HashingWriter(f)
+        # level 1 compresses text well at a fraction of the CPU time of the default level 9
+        out = gzip.GzipFile(fileobj=writer, mode='wb', compresslevel=1, mtime=0) if compress else writer
+        for dataset in datasets:
+            with open(dataset.path, 'rb', buffering=0) as source:
+                while True:
+                    n = source.readinto(buffer)
+                    if not n:
+                        break
+                    out.write(buffer[:n])
+                    bytes_read += n
+        if compress:
+            out.close()
+    seconds = time.perf_counter() - start
+
+    output.metadata['inputs'] = len(datasets)
+    output.metadata['bytes_read'] = bytes_read
+    output.metadata['bytes_written'] = writer.bytes_written
+    output.metadata['compression'] = 'gzip' if compress else 'none'
+    output.metadata['sha256'] = writer.sha256.hexdigest()
+    output.metadata['throughput_mb_per_s'] = round(bytes_read / 1024 / 1024 / max(seconds, 1e-9), 1)
+    print(f"Merged {len(datasets)} datasets, {bytes_read} bytes into {writer.bytes_written} bytes "
+          f"in {seconds:.2f}s ({output.metadata['throughput_mb_per_s']} MB/s), sha256 {output.metadata['sha256']}")
+
+
+@dsl.pipeline
+def streaming_components_pipeline(
+    input_data: str = 'Hello world!',
+    part_sizes_mb: List[int] = [256, 256, 256, 256],
+    compress: bool = False,
+):
+    # one ingest task per part, all of them merged into one dataset
+    with dsl.ParallelFor(items=part_sizes_mb) as size_mb:
+        ingested = ingest_data_streaming(input_data=input_data, size_mb=size_mb)
+    merge_data_streaming(datasets=dsl.Collected(ingested.outputs['output']), compress=compress)
@@ -1,9 +1,144 @@
+import json
+import os
 import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
 import requests
 from urllib.parse import urlsplit
 
+# file in which session cookies are cached between processes, readable by the owner only
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "kubeflow", "auth_sessions.json")
+
+# lifetime assumed for session cookies without an expiry (Kubeflow's default is 24 hours)
+DEFAULT_MAX_AGE = 12 * 60 * 60
+
+# cookies this close to their expiry are refreshed rather than used
+EXPIRY_MARGIN = 60
+
+# sessions of this process, keyed by (url, username)
+_sessions = {}
+_lock = threading.RLock()
+_http_session = None
+
+
+def get_http_session() -> requests.Session:
+    """
+    Return the `requests.Session` shared by all calls in this process, so that connections
+    to the Kubeflow endpoint and Dex are pooled and kept alive.
+
+    :return: the shared session
+    """
+    global _http_session
+    if _http_session is None:
+        _http_session = requests.Session()
+    return _http_session
+
+
+def get_istio_auth_session(
+    url: str,
+    username: str,
+    password: str,
+    cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+    max_age: int = DEFAULT_MAX_AGE,
+) -> dict:
+    """
+    Get a Dex session cookie for the specified URL, logging in only if there is no valid cached one.
+
+    Sessions are cached in this process and in `cache_path`, together with the time they expire. A
+    session from the file is checked with a single request to `url` before it is used, and a new one
+    is obtained with `login_istio_auth_session` if it expired or was rejected.
+
+    :param url: Kubeflow server URL, including protocol
+    :param username: Dex `staticPasswords` or `LDAP` username
+    :param password: Dex `staticPasswords` or `LDAP` password
+    :param cache_path: file in which sessions are cached (created with mode 0600), None to disable it
+    :param max_age: lifetime in seconds assumed for session cookies without an expiry
+    :return: auth session information, see `login_istio_auth_session`
+    """
+    key = (url, username)
+    # one login at a time, so that concurrent callers reuse the same new session
+    with _lock:
+        auth_session = _sessions.get(key)
+        if auth_session is not None and not _is_expired(auth_session):
+            return auth_session
+
+        if cache_path is not None:
+            auth_session = _read_cache(cache_path).get(_cache_key(url, username))
+            if auth_session is not None and not _is_expired(auth_session) and _is_accepted(auth_session):
+                _sessions[key] = auth_session
+                return auth_session
+
+        auth_session = login_istio_auth_session(url, username, password, max_age=max_age)
+        if auth_session["is_secured"]:
+            _sessions[key] = auth_session
+            if cache_path is not None:
+                _write_cache(cache_path, _cache_key(url, username), auth_session)
+        return auth_session
+
 
-def get_istio_auth_session(url: str, username: str, password: str) -> dict:
+def _cache_key(url: str, username: str) -> str:
+    return f"{username}@{url}"
+
+
+def _is_expired(auth_session: dict) -> bool:
+    return auth_session.get("expires_at") is None or auth_session["expires_at"] - EXPIRY_MARGIN < time.time()
+
+
+def _is_accepted(auth_session: dict) -> bool:
+    """Check a session cookie with one GET: without a valid session, Kubeflow redirects to Dex."""
+    try:
+        resp = get_http_session().get(
+            auth_session["endpoint_url"],
+            headers={"Cookie": auth_session["session_cookie"]},
+            allow_redirects=False,
+            verify=False,
+        )
+    except requests.RequestException:
+        return False
+    return resp.status_code == 200
+
+
+def _read_cache(cache_path: str) -> dict:
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(cache_path: str, key: str, auth_session: dict) -> None:
+    cache_dir = os.path.dirname(os.path.abspath(cache_path))
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    cache = _read_cache(cache_path)
+    cache[key] = auth_session
+    # mkstemp creates the file with mode 0600, and the rename replaces the cache atomically
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".auth_sessions-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def _pooled_session() -> Iterator[requests.Session]:
+    """Lend the shared session with an empty cookie jar to one caller at a time."""
+    s = get_http_session()
+    with _lock:
+        s.cookies.clear()
+        try:
+            yield s
+        finally:
+            s.cookies.clear()
+
+
+def login_istio_auth_session(url: str, username: str, password: str, max_age: int = DEFAULT_MAX_AGE) -> dict:
     """
     Determine if the specified URL is secured by Dex and try to obtain a session cookie.
     WARNING: only Dex `staticPasswords` and `LDAP` authentication are currently supported
@@ -12,6 +147,7 @@ def get_istio_auth_session(url: str, username: str, password: str) -> dict:
     :param url: Kubeflow server URL, including protocol
     :param username: Dex `staticPasswords` or `LDAP` username
     :param password: Dex `staticPasswords` or `LDAP` password
+    :param max_age: lifetime in seconds assumed for session cookies without an expiry
     :return: auth session information
     """
     # define the default return object
@@ -20,11 +156,12 @@ def get_istio_auth_session(url: str, username: str, password: str) -> dict:
         "redirect_url": None,  # KF redirect URL, if applicable
         "dex_login_url": None,  # Dex login URL (for POST of credentials)
         "is_secured": None,  # True if KF endpoint is secured
-        "session_cookie": None  # Resulting session cookies in the form "key1=value1; key2=value2"
+        "session_cookie": None,  # Resulting session cookies in the form "key1=value1; key2=value2"
+        "expires_at": None  # Unix time at which the session cookies expire
     }
 
-    # use a persistent session (for cookies)
-    with requests.Session() as s:
+    # use the pooled session, without the cookies of earlier logins
+    with _pooled_session() as s:
 
         ################
         # Determine if Endpoint is Secured
@@ -97,4 +234,8 @@ def get_istio_auth_session(url: str, username: str, password: str) -> dict:
         # store the session cookies in a "key1=value1; key2=value2" string
         auth_session["session_cookie"] = "; ".join([f"{c.name}={c.value}" for c in s.cookies])
 
+        # the session ends with the first cookie that expires
+        expiries = [c.expires for c in s.cookies if c.expires is not None]
+        auth_session["expires_at"] = min(expiries) if expiries else time.time() + max_age
+
     return auth_session
@@ -0,0 +1,263 @@
+"""
+Submits many runs of a pipeline at once, e.g. for a parameter sweep.
+
+The pipeline is compiled once and the package is cached under a hash of the pipeline
+module's source and the KFP version, so unchanged pipelines are not compiled again.
+The runs are then created concurrently, with retries for transient API errors.
+
+Usage (from the `pipelines` directory):
+    python -m utils.bulk_submit minimal-container-components/pipeline.py:container_components_pipeline \
+        --sweep sweep.jsonl --experiment-name my-sweep --output runs.jsonl
+
+Each line of the sweep file is a JSON object with the arguments of one run, e.g.
+`{"input1": "Hello", "input2": "world!"}`. Remotely, set `KUBEFLOW_ENDPOINT`,
+`KUBEFLOW_USERNAME` and `KUBEFLOW_PASSWORD` as for `submit-remote.py`.
+"""
+import argparse
+import datetime
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+import kfp
+import kfp_server_api
+import urllib3
+from kfp import compiler
+from kfp.client import Client
+
+from .auth_session import get_istio_auth_session
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "kubeflow", "compiled_pipelines")
+
+# statuses with which the API rejected a request before creating the run, so it is safe to retry
+RETRY_STATUSES = {429, 502, 503}
+
+
+def load_pipeline(spec: str) -> Callable:
+    """
+    Import a pipeline function given as `path/to/module.py:function_name`.
+
+    The directory of the module is added to `sys.path`, so that it can import its neighbours.
+
+    :param spec: module file and attribute name, separated by a colon
+    :return: the pipeline function
+    """
+    path, _, name = spec.rpartition(":")
+    if not path or not name:
+        raise ValueError(f"Expected 'path/to/module.py:function_name', got '{spec}'")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    module_spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], path)
+    module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(module)
+    return getattr(module, name)
+
+
+def pipeline_hash(pipeline_func: Callable) -> str:
+    """
+    Hash the source of the module defining the pipeline (which includes its components, if they are
+    defined next to it) together with the pipeline name and the KFP version.
+
+    :param pipeline_func: a function decorated with `@dsl.pipeline`
+    :return: hex digest identifying the compiled package
+    """
+    func = getattr(pipeline_func, "pipeline_func", pipeline_func)
+    with open(inspect.getsourcefile(func)) as f:
+        source = f.read()
+    key = json.dumps([source, func.__name__, kfp.__version__])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def compile_cached(pipeline_func: Callable, cache_dir: str = DEFAULT_CACHE_DIR, recompile: bool = False) -> str:
+    """
+    Compile a pipeline unless a package with the same `pipeline_hash` is cached.
+
+    Components imported from other modules are not part of the hash, pass `recompile=True`
+    after changing them.
+
+    :param pipeline_func: a function decorated with `@dsl.pipeline`
+    :param cache_dir: directory of the compiled packages
+    :param recompile: compile even if a cached package exists
+    :return: path of the compiled package
+    """
+    name = getattr(pipeline_func, "name", None) or pipeline_func.__name__
+    package_path = os.path.join(cache_dir, f"{name}-{pipeline_hash(pipeline_func)[:16]}.yaml")
+    if recompile or not os.path.exists(package_path):
+        os.makedirs(cache_dir, exist_ok=True)
+        # compile next to the package and rename, so that concurrent invocations never read half a file
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".yaml")
+        os.close(fd)
+        try:
+            compiler.Compiler().compile(pipeline_func, tmp_path)
+            os.replace(tmp_path, package_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    return package_path
+
+
+def read_sweep(path: str, defaults: Dict) -> Iterator[Dict]:
+    """
+    Yield the arguments of every run from a JSON lines file, or from stdin if `path` is `-`.
+
+    :param path: sweep file with one JSON object per line
+    :param defaults: arguments of all runs, overridden by those in the file
+    :return: iterator over the arguments of the runs
+    """
+    f = sys.stdin if path == "-" else open(path)
+    try:
+        for line in f:
+            if line.strip():
+                yield {**defaults, **json.loads(line)}
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _is_retryable(exception: Exception) -> bool:
+    if isinstance(exception, kfp_server_api.ApiException):
+        return exception.status in RETRY_STATUSES
+    # raised when the connection failed, before the request reached the API
+    return isinstance(exception, (urllib3.exceptions.MaxRetryError, urllib3.exceptions.NewConnectionError))
+
+
+def with_retries(func: Callable, retries: int = 5, backoff: float = 1.0) -> Callable:
+    """
+    Wrap `func` so that transient API and connection errors are retried with exponential backoff.
+
+    :param func: function to call
+    :param retries: number of retries after the first attempt
+    :param backoff: delay in seconds before the first retry, doubled for every further one
+    :return: the wrapped function
+    """
+    def wrapper(*args, **kwargs):
+        for attempt in range(retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == retries or not _is_retryable(e):
+                    raise
+                # jitter spreads out the retries of concurrent submissions
+                time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    return wrapper
+
+
+def submit_runs(
+    client: Client,
+    package_path: str,
+    runs: Iterator[Dict],
+    experiment_name: str,
+    run_name_prefix: str,
+    max_workers: int = 8,
+    enable_caching: Optional[bool] = None,
+    retries: int = 5,
+    backoff: float = 1.0,
+) -> List[Dict]:
+    """
+    Create one run of a compiled pipeline per set of arguments, with up to `max_workers` concurrent requests.
+
+    :param client: KFP client
+    :param package_path: compiled pipeline package, see `compile_cached`
+    :param runs: arguments of the runs
+    :param experiment_name: experiment of the runs, created if it doesn't exist
+    :param run_name_prefix: runs are named `{run_name_prefix} {index}`
+    :param max_workers: maximum number of concurrent requests
+    :param enable_caching: overrides the caching setting of the pipeline if not None
+    :param retries: number of retries of a run after transient errors
+    :param backoff: delay in seconds before the first retry
+    :return: one dict per run with its `run_name`, `arguments` and `run_id`, or `error` if it failed
+    """
+    # gets the experiment if it exists already
+    experiment = with_retries(client.create_experiment, retries, backoff)(experiment_name)
+    create_run = with_retries(client.run_pipeline, retries, backoff)
+
+    def submit(index: int, arguments: Dict) -> Dict:
+        result = {"run_name": f"{run_name_prefix} {index}", "arguments": arguments}
+        try:
+            run = create_run(
+                experiment_id=experiment.experiment_id,
+                job_name=result["run_name"],
+                pipeline_package_path=package_path,
+                params=arguments,
+                enable_caching=enable_caching,
+            )
+            result["run_id"] = run.run_id
+        except Exception as e:
+            # the message of ApiException spans several lines with the response headers and body
+            result["error"] = f"{type(e).__name__}: {' '.join(str(e).split())}"
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(submit, index, arguments) for index, arguments in enumerate(runs)]
+        return [future.result() for future in futures]
+
+
+def make_client() -> Client:
+    """
+    Create a KFP client, authenticated through Dex if `KUBEFLOW_ENDPOINT` is set (see `submit-remote.py`),
+    and with the in-cluster configuration otherwise.
+
+    :return: KFP client
+    """
+    if "KUBEFLOW_ENDPOINT" not in os.environ:
+        return Client()
+    auth_session = get_istio_auth_session(
+        url=os.environ['KUBEFLOW_ENDPOINT'],
+        username=os.environ['KUBEFLOW_USERNAME'],
+        password=os.environ['KUBEFLOW_PASSWORD']
+    )
+    namespace = os.environ.get('KUBEFLOW_NAMESPACE', None) or \
+        os.environ['KUBEFLOW_USERNAME'].split("@")[0].replace(".", "-")
+    return Client(host=f"{os.environ['KUBEFLOW_ENDPOINT']}/pipeline", namespace=namespace,
+                  cookies=auth_session["session_cookie"], verify_ssl=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pipeline", help="Pipeline function as path/to/module.py:function_name.")
+    parser.add_argument("--sweep", required=True, help="JSON lines file with the arguments of the runs, - for stdin.")
+    parser.add_argument("--arguments", default="{}", help="JSON object with arguments shared by all runs.")
+    parser.add_argument("--experiment-name", required=True)
+    parser.add_argument("--run-name", default=None, help="Prefix of the run names, defaults to the pipeline and time.")
+    parser.add_argument("--max-workers", type=int, default=8, help="Maximum number of concurrent requests.")
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--caching", choices=["on", "off"], default=None, help="Override the pipeline's caching.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Directory of the compiled pipelines.")
+    parser.add_argument("--recompile", action="store_true", help="Compile even if the pipeline is cached.")
+    parser.add_argument("--output", default=None, help="JSON lines file for the submitted runs.")
+    args = parser.parse_args()
+
+    pipeline_func = load_pipeline(args.pipeline)
+    start = time.perf_counter()
+    package_path = compile_cached(pipeline_func, args.cache_dir, recompile=args.recompile)
+    print(f"Pipeline package {package_path} ready in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    results = submit_runs(
+        make_client(),
+        package_path,
+        read_sweep(args.sweep, json.loads(args.arguments)),
+        experiment_name=args.experiment_name,
+        run_name_prefix=args.run_name or f"{pipeline_func.name} {datetime.datetime.now():%Y-%m-%d %H:%M:%S}",
+        max_workers=args.max_workers,
+        enable_caching=None if args.caching is None else args.caching == "on",
+        retries=args.retries,
+    )
+    failed = [r for r in results if "error" in r]
+    for r in failed:
+        print(f"Failed to submit '{r['run_name']}': {r['error']}")
+    print(f"Submitted {len(results) - len(failed)} of {len(results)} runs in {time.perf_counter() - start:.2f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            for r in results:
+                f.write(json.dumps(r) + "\n")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,183 @@
+"""
+Follows many pipeline runs until they finish, e.g. the runs submitted by `bulk_submit.py`.
+
+The states of all runs are fetched with one `list_runs` request per 100 runs instead of a
+`get_run` per run. The polling interval grows while nothing changes and drops back once a
+run changes its state. Every state change is printed as it is seen, followed by a summary
+table once all runs finished.
+
+Usage (from the `pipelines` directory):
+    python -m utils.monitor_runs --runs runs.jsonl
+    python -m utils.monitor_runs RUN_ID [RUN_ID ...]
+"""
+import argparse
+import datetime
+import json
+import sys
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from kfp.client import Client
+
+from .bulk_submit import make_client, with_retries
+
+# states after which a run doesn't change anymore
+FINAL_STATES = {"SUCCEEDED", "FAILED", "SKIPPED", "CANCELED"}
+
+# number of run IDs per list_runs request
+BATCH_SIZE = 100
+
+
+def list_runs_by_id(client: Client, run_ids: List[str], namespace: Optional[str] = None) -> Iterator:
+    """
+    Fetch runs with one `list_runs` request per `BATCH_SIZE` run IDs.
+
+    :param client: KFP client
+    :param run_ids: IDs of the runs
+    :param namespace: namespace of the runs, None for the namespace of the client
+    :return: iterator over the runs that were found
+    """
+    list_runs = with_retries(client.list_runs)
+    for start in range(0, len(run_ids), BATCH_SIZE):
+        batch = run_ids[start:start + BATCH_SIZE]
+        run_filter = json.dumps({
+            "predicates": [{"key": "run_id", "operation": "IN", "string_values": {"values": batch}}]
+        })
+        response = list_runs(page_size=len(batch), filter=run_filter, namespace=namespace)
+        yield from response.runs or []
+
+
+def monitor_runs(
+    client: Client,
+    run_ids: Iterable[str],
+    min_interval: float = 5.0,
+    max_interval: float = 60.0,
+    timeout: Optional[float] = None,
+    on_change: Optional[Callable] = None,
+    namespace: Optional[str] = None,
+) -> Dict[str, object]:
+    """
+    Poll the states of runs until all of them are in a final state.
+
+    Runs in a final state are not polled anymore, and neither are runs that were not found
+    by the first poll (e.g. mistyped, deleted, or in another namespace), which are missing
+    from the result. The interval between polls starts at `min_interval` and grows by half
+    after every poll without a state change, up to `max_interval`.
+
+    :param client: KFP client
+    :param run_ids: IDs of the runs
+    :param min_interval: seconds between polls while runs change their states
+    :param max_interval: longest interval between polls
+    :param timeout: seconds after which to stop polling, None to wait until all runs finished
+    :param on_change: called as `on_change(run, previous_state)` whenever the state of a run changes
+    :param namespace: namespace of the runs, None for the namespace of the client
+    :return: the last seen run of every run ID that was found
+    """
+    pending = list(dict.fromkeys(run_ids))
+    runs = {}
+    interval = min_interval
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while pending:
+        changed = False
+        for run in list_runs_by_id(client, pending, namespace):
+            previous = runs.get(run.run_id)
+            previous_state = previous.state if previous is not None else None
+            runs[run.run_id] = run
+            if run.state != previous_state:
+                changed = True
+                if on_change is not None:
+                    on_change(run, previous_state)
+        # run IDs missing after the first poll are not polled again, they would never finish
+        pending = [run_id for run_id in pending if run_id in runs and runs[run_id].state not in FINAL_STATES]
+        if not pending or (deadline is not None and time.monotonic() >= deadline):
+            break
+
+        interval = min_interval if changed else min(interval * 1.5, max_interval)
+        if deadline is not None:
+            interval = min(interval, max(deadline - time.monotonic(), 0))
+        time.sleep(interval)
+    return runs
+
+
+def print_change(run, previous_state: Optional[str]) -> None:
+    """Print a state change of a run as one line, for `monitor_runs(on_change=...)`."""
+    now = datetime.datetime.now().strftime("%H:%M:%S")
+    print(f"{now} {run.display_name} ({run.run_id}): {previous_state or 'NEW'} -> {run.state}", flush=True)
+
+
+def _duration(run) -> str:
+    if run.created_at is None:
+        return ""
+    end = run.finished_at if run.state in FINAL_STATES and run.finished_at else None
+    end = end or datetime.datetime.now(run.created_at.tzinfo)
+    return str(datetime.timedelta(seconds=round((end - run.created_at).total_seconds())))
+
+
+def format_summary(runs: Dict[str, object], run_ids: Iterable[str]) -> str:
+    """
+    Format a table with the name, state and duration of every run, followed by the number of runs per state.
+
+    :param runs: the runs returned by `monitor_runs`
+    :param run_ids: IDs of all monitored runs, in the order of the table
+    :return: the table
+    """
+    rows = [("RUN", "STATE", "DURATION", "RUN ID")]
+    for run_id in dict.fromkeys(run_ids):
+        run = runs.get(run_id)
+        if run is None:
+            rows.append(("", "NOT FOUND", "", run_id))
+        else:
+            rows.append((run.display_name or "", run.state or "", _duration(run), run_id))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = ["  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in rows]
+
+    counts = Counter(row[1] for row in rows[1:])
+    lines.append("")
+    lines.append(", ".join(f"{state}: {count}" for state, count in sorted(counts.items())))
+    return "\n".join(lines)
+
+
+def read_run_ids(path: str) -> List[str]:
+    """
+    Read the run IDs of a JSON lines file written by `bulk_submit.py --output`, or from stdin if `path` is `-`.
+    Runs that failed to submit are skipped.
+
+    :param path: JSON lines file with a `run_id` per line
+    :return: the run IDs
+    """
+    f = sys.stdin if path == "-" else open(path)
+    try:
+        return [run["run_id"] for run in map(json.loads, filter(str.strip, f)) if "run_id" in run]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("run_ids", nargs="*", help="IDs of the runs.")
+    parser.add_argument("--runs", default=None, help="JSON lines file written by bulk_submit.py --output, - for stdin.")
+    parser.add_argument("--min-interval", type=float, default=5.0, help="Seconds between polls while runs change.")
+    parser.add_argument("--max-interval", type=float, default=60.0, help="Longest interval between polls.")
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds after which to stop waiting.")
+    parser.add_argument("--namespace", default=None, help="Namespace of the runs, defaults to that of the client.")
+    args = parser.parse_args()
+
+    run_ids = args.run_ids + (read_run_ids(args.runs) if args.runs else [])
+    if not run_ids:
+        parser.error("no runs given, pass run IDs or --runs")
+
+    runs = monitor_runs(
+        make_client(),
+        run_ids,
+        min_interval=args.min_interval,
+        max_interval=args.max_interval,
+        timeout=args.timeout,
+        on_change=print_change,
+        namespace=args.namespace,
+    )
+    print()
+    print(format_summary(runs, run_ids))
+    succeeded = sum(1 for run in runs.values() if run.state == "SUCCEEDED")
+    sys.exit(0 if succeeded == len(set(run_ids)) else 1)
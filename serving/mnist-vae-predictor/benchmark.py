@@ -0,0 +1,83 @@
+"""
+Measures the throughput of a running MNIST VAE predictor.
+
+Sends batches of random images to the encoder (or random latent vectors to the decoder)
+with a number of concurrent clients and reports requests/s, instances/s and latency
+percentiles.
+
+Usage:
+    python benchmark.py --url http://localhost:8080 --operation encode --batch-size 64 --concurrency 8
+"""
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def build_payload(batch: list, protocol: str) -> dict:
+    if protocol == "v2":
+        return {
+            "inputs": [
+                {
+                    "name": "input-0",
+                    "shape": [len(batch), len(batch[0])],
+                    "datatype": "FP32",
+                    "data": [value for row in batch for value in row],
+                }
+            ]
+        }
+    return {"instances": batch}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--model-name", default="mnist-vae")
+    parser.add_argument("--operation", choices=["encode", "decode"], default="encode")
+    parser.add_argument("--latent-dim", type=int, default=2, help="Latent dimension of the served model.")
+    parser.add_argument("--protocol", choices=["v1", "v2"], default="v1")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--header", action="append", default=[], help="Extra header, e.g. 'x-api-key: ...'")
+    args = parser.parse_args()
+
+    width = 784 if args.operation == "encode" else args.latent_dim
+    rng = random.Random(42)
+    rows = [[rng.random() for _ in range(width)] for _ in range(args.batch_size * 8)]
+    batches = [
+        [rows[(i * args.batch_size + j) % len(rows)] for j in range(args.batch_size)]
+        for i in range(args.requests)
+    ]
+    model = f"{args.model_name}-{args.operation}r"  # mnist-vae-encoder or mnist-vae-decoder
+    if args.protocol == "v2":
+        endpoint = f"{args.url}/v2/models/{model}/infer"
+    else:
+        endpoint = f"{args.url}/v1/models/{model}:predict"
+    headers = dict(h.split(":", 1) for h in args.header)
+    headers = {k.strip(): v.strip() for k, v in headers.items()}
+    session = requests.Session()
+
+    def send(batch: list) -> float:
+        start = time.perf_counter()
+        response = session.post(endpoint, json=build_payload(batch, args.protocol), headers=headers, verify=False)
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = sorted(pool.map(send, batches))
+    elapsed = time.perf_counter() - start
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+    print(f"requests:     {len(latencies)} ({args.operation}, {args.protocol}, batch size {args.batch_size}, "
+          f"{args.concurrency} clients)")
+    print(f"requests/s:   {len(latencies) / elapsed:.1f}")
+    print(f"instances/s:  {len(latencies) * args.batch_size / elapsed:.1f}")
+    print(f"latency (ms): mean {statistics.mean(latencies) * 1000:.1f}, "
+          f"p50 {percentile(50):.1f}, p95 {percentile(95):.1f}, p99 {percentile(99):.1f}")
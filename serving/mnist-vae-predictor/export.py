@@ -0,0 +1,24 @@
+"""
+Exports a Lightning checkpoint of the MNIST VAE as TorchScript.
+
+The predictor loads `model.pt` faster than a checkpoint, since the network doesn't
+have to be built and no optimizer state has to be read.
+
+Usage:
+    python export.py --checkpoint epoch=49-step=93750.ckpt --output model-dir/model.pt
+"""
+import argparse
+
+import torch
+
+from main import VAENetwork
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checkpoint", required=True, help="Lightning checkpoint of the VAE.")
+    parser.add_argument("--output", default="model.pt")
+    args = parser.parse_args()
+
+    network = VAENetwork.from_checkpoint(args.checkpoint).eval()
+    torch.jit.save(torch.jit.script(network), args.output)
+    print(f"Exported {args.checkpoint} to {args.output}")
@@ -0,0 +1,154 @@
+import glob
+import os
+import time
+from typing import Dict, Union
+
+# measured from here, so that the reported cold start includes the imports
+PROCESS_START = time.perf_counter()
+
+import numpy as np
+import torch
+from kserve import InferOutput, InferRequest, InferResponse, Model, ModelServer
+from kserve.logging import configure_logging, logger
+from kserve.utils.utils import generate_uuid
+from torch import nn
+
+TORCHSCRIPT_FILE = "model.pt"
+
+
+class VAENetwork(nn.Module):
+    """
+    Inference part of the `VAE` in `notebooks/mnist-vae/model/vae.py`. The layers have the
+    same names, so that the state dict of a Lightning checkpoint can be loaded without
+    Lightning or the training code. The log variance layer is only needed for training.
+    """
+
+    def __init__(self, input_dim: int = 784, hidden_dim: int = 400, latent_dim: int = 200):
+        super().__init__()
+        self.encoder = nn.Sequential(
+            nn.Linear(input_dim, hidden_dim),
+            nn.LeakyReLU(0.2),
+            nn.Linear(hidden_dim, hidden_dim),
+            nn.LeakyReLU(0.2),
+        )
+        self.mean_layer = nn.Linear(hidden_dim, latent_dim)
+        self.decoder = nn.Sequential(
+            nn.Linear(latent_dim, hidden_dim),
+            nn.LeakyReLU(0.2),
+            nn.Linear(hidden_dim, hidden_dim),
+            nn.LeakyReLU(0.2),
+            nn.Linear(hidden_dim, input_dim),
+            nn.Sigmoid(),
+        )
+
+    @torch.jit.export
+    def encode(self, x: torch.Tensor) -> torch.Tensor:
+        """Returns the latent means of a batch of flattened images."""
+        return self.mean_layer(self.encoder(x))
+
+    @torch.jit.export
+    def decode(self, z: torch.Tensor) -> torch.Tensor:
+        """Returns the flattened images decoded from a batch of latent vectors."""
+        return self.decoder(z)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.encode(x)
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint_path: str) -> "VAENetwork":
+        checkpoint = torch.load(checkpoint_path, map_location="cpu", weights_only=True)
+        hparams = checkpoint["hyper_parameters"]
+        network = cls(hparams["input_dim"], hparams["hidden_dim"], hparams["latent_dim"])
+        network.load_state_dict(
+            {k: v for k, v in checkpoint["state_dict"].items() if not k.startswith("logvar_layer.")}
+        )
+        return network
+
+
+def load_network(model_dir: str) -> torch.nn.Module:
+    """
+    Loads the TorchScript export `model.pt` from `model_dir` if it exists (see export.py),
+    which starts faster, and otherwise the newest Lightning checkpoint (`*.ckpt`).
+    """
+    torchscript_path = os.path.join(model_dir, TORCHSCRIPT_FILE)
+    if os.path.exists(torchscript_path):
+        network = torch.jit.load(torchscript_path, map_location="cpu")
+    else:
+        checkpoints = glob.glob(os.path.join(model_dir, "**", "*.ckpt"), recursive=True)
+        if not checkpoints:
+            raise FileNotFoundError(f"Neither {TORCHSCRIPT_FILE} nor a *.ckpt file found in {model_dir}")
+        network = VAENetwork.from_checkpoint(max(checkpoints, key=os.path.getmtime))
+    return network.eval()
+
+
+class MnistVAEPredictor(Model):
+    """
+    Serves one operation of the MNIST VAE, `encode` (images to latent means) or
+    `decode` (latent vectors to images), on a network shared with the other operation.
+    All instances of a request go through the network as one batch.
+    """
+
+    def __init__(self, name: str, network: torch.nn.Module, operation: str):
+        super().__init__(name)
+        self.name = name
+        self.network = network
+        self.operation = operation
+        self.ready = True
+
+    def _run(self, x: np.ndarray) -> np.ndarray:
+        with torch.inference_mode():
+            x = torch.as_tensor(x, dtype=torch.float32)
+            if self.operation == "encode":
+                # accept (batch, 28, 28) images as well as flattened ones
+                return self.network.encode(x.reshape(x.shape[0], -1)).numpy()
+            return self.network.decode(x).reshape(x.shape[0], 28, 28).numpy()
+
+    def predict(
+        self,
+        payload: Union[Dict, InferRequest],
+        headers: Dict[str, str] = None,
+        response_headers: Dict[str, str] = None,
+    ) -> Union[Dict, InferResponse]:
+        """Encodes or decodes every instance (V1) or every row of the input tensor (V2)."""
+        if isinstance(payload, InferRequest):
+            outputs = self._run(payload.inputs[0].as_numpy())
+            return InferResponse(
+                response_id=payload.id or generate_uuid(),
+                model_name=self.name,
+                infer_outputs=[
+                    InferOutput(
+                        name="latent_mean" if self.operation == "encode" else "image",
+                        shape=list(outputs.shape),
+                        datatype="FP32",
+                        data=outputs,
+                    )
+                ],
+            )
+
+        if "instances" not in payload or not payload["instances"]:
+            return {"predictions": []}
+        return {"predictions": self._run(np.array(payload["instances"], dtype=np.float32)).tolist()}
+
+
+if __name__ == "__main__":
+    # the model is loaded before the server starts, so set up logging to report the load time
+    configure_logging()
+    if "NUM_THREADS" in os.environ:
+        torch.set_num_threads(int(os.environ["NUM_THREADS"]))
+    model_name = os.environ.get("MODEL_NAME", "mnist-vae")
+    model_dir = os.environ.get("MODEL_DIR", "/mnt/models")
+
+    start = time.perf_counter()
+    network = load_network(model_dir)
+    logger.info(
+        "Model loaded in %.3fs, ready %.3fs after process start",
+        time.perf_counter() - start,
+        time.perf_counter() - PROCESS_START,
+    )
+
+    ModelServer().start(
+        [
+            MnistVAEPredictor(f"{model_name}-encoder", network, "encode"),
+            MnistVAEPredictor(f"{model_name}-decoder", network, "decode"),
+        ]
+    )
@@ -0,0 +1,102 @@
+import os
+import time
+import warnings
+from typing import Dict, Union
+
+# measured from here, so that the reported cold start includes the imports
+PROCESS_START = time.perf_counter()
+
+import numpy as np
+from joblib import load
+from kserve import InferOutput, InferRequest, InferResponse, Model, ModelServer
+from kserve.logging import configure_logging, logger
+from kserve.utils.utils import generate_uuid
+
+# the model was fitted on a DataFrame, but the fused path passes plain arrays
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+
+class MobilePriceSVMPredictor(Model):
+    """
+    Serves the `trained_model` and `fitted_scaler` artifacts of the mobile price
+    classification pipeline. Both are loaded once at startup, MinMax scaling and
+    prediction run as one vectorized path over all instances of a request.
+    """
+
+    def __init__(self, name: str, model_dir: str):
+        super().__init__(name)
+        self.name = name
+        self.model_dir = model_dir
+        self.load()
+
+    def load(self) -> bool:
+        start = time.perf_counter()
+
+        # joblib stores numpy arrays uncompressed by default, so the support vectors
+        # and scaler arrays can be memory-mapped instead of copied into memory
+        scaler = load(os.path.join(self.model_dir, "fitted_scaler"), mmap_mode="r")
+        self.svm = load(os.path.join(self.model_dir, "trained_model"), mmap_mode="r")
+
+        # MinMaxScaler.transform is x * scale_ + min_
+        self.scale = np.asarray(scaler.scale_, dtype=np.float64)
+        self.offset = np.asarray(scaler.min_, dtype=np.float64)
+        self.feature_names = list(getattr(scaler, "feature_names_in_", []))
+
+        self.ready = True
+        logger.info(
+            "Model loaded in %.3fs, ready %.3fs after process start",
+            time.perf_counter() - start,
+            time.perf_counter() - PROCESS_START,
+        )
+        return self.ready
+
+    def _to_array(self, instances: list) -> np.ndarray:
+        """Accepts instances as lists of feature values or as dicts keyed by feature name."""
+        if instances and isinstance(instances[0], dict):
+            return np.array(
+                [[instance[name] for name in self.feature_names] for instance in instances],
+                dtype=np.float64,
+            )
+        return np.array(instances, dtype=np.float64)
+
+    def _scale_and_predict(self, x: np.ndarray) -> np.ndarray:
+        x = np.array(x, dtype=np.float64, ndmin=2)  # copy, so we can scale in place
+        np.multiply(x, self.scale, out=x)
+        np.add(x, self.offset, out=x)
+        return self.svm.predict(x)
+
+    def predict(
+        self,
+        payload: Union[Dict, InferRequest],
+        headers: Dict[str, str] = None,
+        response_headers: Dict[str, str] = None,
+    ) -> Union[Dict, InferResponse]:
+        """Predicts the price range of every instance (V1) or every row of the input tensor (V2)."""
+        if isinstance(payload, InferRequest):
+            predictions = self._scale_and_predict(payload.inputs[0].as_numpy())
+            return InferResponse(
+                response_id=payload.id or generate_uuid(),
+                model_name=self.name,
+                infer_outputs=[
+                    InferOutput(
+                        name="price_range",
+                        shape=list(predictions.shape),
+                        datatype="INT64",
+                        data=predictions.astype(np.int64),
+                    )
+                ],
+            )
+
+        if "instances" not in payload or not payload["instances"]:
+            return {"predictions": []}
+        predictions = self._scale_and_predict(self._to_array(payload["instances"]))
+        return {"predictions": predictions.tolist()}
+
+
+if __name__ == "__main__":
+    # the model is loaded before the server starts, so set up logging to report the load time
+    configure_logging()
+    model_name = os.environ.get("MODEL_NAME", "mobile-price")
+    model_dir = os.environ.get("MODEL_DIR", "/mnt/models")
+    model = MobilePriceSVMPredictor(model_name, model_dir)
+    ModelServer().start([model])